@@ -0,0 +1,118 @@
+"""듀얼 모멘텀 백테스트.
+실매매와 같은 strategy.target_weights 규칙으로 여러 (모멘텀 기간, 리밸런싱 주기) 조합을 한 번에 계산한다.
+일봉은 PRICE_DB(로컬 저장소)에서 읽는다.
+
+사용 예: python backtest.py --market os --lookbacks 20:260:5 --rebalances 1,5,10,21 --update --since 2010-01-01
+"""
+import argparse
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import strategy
+
+
+def load_closes(db_path, symbols, start=None):
+    """로컬 저장소에서 종가를 읽어 날짜 x 종목 DataFrame으로 반환"""
+    marks = ",".join("?" * len(symbols))
+    with sqlite3.connect(db_path) as con:
+        df = pd.read_sql_query(f"SELECT ticker, date, close FROM daily WHERE ticker IN ({marks})", con, params=list(symbols))
+    closes = df.pivot(index="date", columns="ticker", values="close")
+    closes.index = pd.to_datetime(closes.index)
+    if start: closes = closes[closes.index >= pd.Timestamp(start)]
+    return closes.reindex(columns=list(symbols)).ffill().dropna()
+
+
+def _max_drawdown(equity):
+    """equity: (..., 일수) 배열 -> 조합별 최대 낙폭"""
+    peak = np.maximum.accumulate(equity, axis=-1)
+    return (equity / peak - 1).min(axis=-1)
+
+
+def run(closes, safe_symbol, lookbacks, rebalances, top_k=1, cost=0.0):
+    """closes 의 마지막 열이 대피 자산(safe_symbol)이어야 함.
+    (조합별 성과 DataFrame, 조합별 자산곡선 DataFrame) 반환.
+    모멘텀 기간별로 한 번씩 돌면서 모든 리밸런싱 주기를 배열 연산으로 동시에 계산한다."""
+    assert closes.columns[-1] == safe_symbol
+    too_long = [lb for lb in lookbacks if lb >= len(closes)]
+    if too_long:
+        raise ValueError(f"일봉 {len(closes)}개로는 모멘텀 기간 {too_long} 을 계산할 수 없음 (--update --since 로 더 긴 기록을 받거나 기간을 줄이세요)")
+    prices = closes.values
+    risky = prices[:, :-1]
+    asset_ret = np.nan_to_num(prices[1:] / prices[:-1] - 1)  # t -> t+1 수익률
+    rebalances = np.asarray(rebalances)
+    start = max(lookbacks) - 1  # 모든 조합이 같은 구간에서 시작하도록 맞춤
+    days = np.arange(start, len(prices) - 1)
+    # 리밸런싱 주기별로 t일에 보유 중인 비중을 정한 날짜 (R, 일수)
+    reb_day = start + ((days - start)[None, :] // rebalances[:, None]) * rebalances[:, None]
+
+    rows, curves = [], {}
+    for lb in lookbacks:
+        mom = np.full(risky.shape, np.nan)
+        mom[lb - 1:] = risky[lb - 1:] / risky[:len(risky) - lb + 1] - 1  # strategy.momentum 과 같은 iloc[-lb] 기준
+        weights = strategy.target_weights(mom, top_k)  # (전체일수, 종목수+1)
+        held = weights[reb_day]  # (R, 일수, 종목수+1)
+        prev = np.concatenate([np.zeros_like(held[:, :1]), held[:, :-1]], axis=1)
+        turnover = np.abs(held - prev).sum(axis=-1) / 2  # 편도 회전율
+        port_ret = (held * asset_ret[days]).sum(axis=-1) - cost * turnover
+        equity = np.cumprod(1 + port_ret, axis=-1)
+        years = len(days) / 252
+        mdd = _max_drawdown(equity)
+        vol = port_ret.std(axis=-1) * np.sqrt(252)
+        for i, rb in enumerate(rebalances):
+            cagr = equity[i, -1] ** (1 / years) - 1
+            rows.append({"lookback": lb, "rebalance": int(rb), "total_return": equity[i, -1] - 1, "cagr": cagr,
+                         "mdd": mdd[i], "sharpe": (port_ret[i].mean() * 252) / vol[i] if vol[i] else 0.0,
+                         "turnover_per_year": turnover[i].sum() / years})
+            curves[(lb, int(rb))] = equity[i]
+
+    summary = pd.DataFrame(rows).sort_values("cagr", ascending=False, ignore_index=True)
+    equity = pd.DataFrame(curves, index=closes.index[days + 1])
+    return summary, equity
+
+
+def _parse_range(text):
+    """'20:260:10' (시작:끝:간격) 또는 '60,126,252' 형식"""
+    if ":" in text:
+        start, stop, step = (int(x) for x in text.split(":"))
+        return list(range(start, stop + 1, step))
+    return [int(x) for x in text.split(",")]
+
+
+if __name__ == "__main__":
+    import final_app  # 설정(종목 구성, 저장소 경로)과 저장소 갱신을 실매매 앱과 공유
+
+    parser = argparse.ArgumentParser(description="듀얼 모멘텀 파라미터 백테스트")
+    parser.add_argument("--market", choices=["kr", "os"], default="os")
+    parser.add_argument("--lookbacks", default=str(final_app.LOOKBACK))
+    parser.add_argument("--rebalances", default="1,5,21")
+    parser.add_argument("--top-k", type=int, default=final_app.TOP_K)
+    parser.add_argument("--cost", type=float, default=0.001, help="편도 거래비용 (비율)")
+    parser.add_argument("--start", default=None)
+    parser.add_argument("--update", action="store_true",
+                        help="실행 전 로컬 저장소 갱신 (가장 긴 모멘텀 기간 + 약 3년 치가 없으면 앞쪽을 채움)")
+    parser.add_argument("--since", help="--update 때 이 날짜(YYYY-MM-DD)부터 전체 기록을 다시 받음")
+    parser.add_argument("--show", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.market == "kr":
+        symbols = [f"{c}.KS" for c in final_app.UNIVERSE_KR.values()]
+        safe = f"{next(iter(final_app.SAFE_ASSET_KR.values()))}.KS"
+    else:
+        symbols, safe = list(final_app.UNIVERSE_OS), final_app.SAFE_ASSET_OS
+    if args.update:
+        store, bars = final_app.price_store, max(_parse_range(args.lookbacks)) + 3 * 252
+
+        def fill(sym):
+            store.update(sym)
+            store.backfill(sym, args.since) if args.since else store.ensure(sym, bars)
+        list(final_app.fetch_pool.map(fill, symbols + [safe]))
+
+    closes = load_closes(final_app.PRICE_DB, symbols + [safe], args.start)
+    try:
+        summary, _ = run(closes, safe, _parse_range(args.lookbacks), _parse_range(args.rebalances), args.top_k, args.cost)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"{closes.index[0].date()} ~ {closes.index[-1].date()}, {len(summary)}개 조합")
+    print(summary.head(args.show).to_string(float_format=lambda v: f"{v:.4f}"))
@@ -0,0 +1,148 @@
+"""리밸런싱 / 대시보드 성능 측정.
+로컬 KIS 모의 서버(mock_kis)와 고정 일봉 시세로 돌리므로 실제 KIS 나 야후에 접속하지 않는다.
+--save 로 결과를 저장해 두면 다음 실행에서 --compare 로 변화량을 볼 수 있다.
+
+사용 예: python bench.py --rounds 5 --latency 0.03 --rps 20 --save bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import mock_kis
+import quote_feed
+
+
+def _summary(samples):
+    samples = sorted(samples)
+    return {"rounds": len(samples), "min": samples[0], "median": statistics.median(samples), "max": samples[-1]}
+
+
+class Bench:
+    """final_app 의 KIS 클라이언트/시세 저장소/이벤트 로그를 모의 서버용으로 바꿔 끼운 환경"""
+    def __init__(self, app, args, workdir):
+        self.app = app
+        self.prices = mock_kis.FixturePrices(args.seed)
+        self.broker = mock_kis.MockBroker(self.prices, args.latency, args.jitter, args.error_rate, args.rps, args.fill_polls,
+                                          args.page_size, args.seed, exchanges=app.SYMBOL_EXCHANGE_OS)
+        self.server, url = mock_kis.serve(self.broker)
+        app.kis = app.KisClient(url, app.APP_KEY, app.APP_SECRET, rps=args.client_rps, token_file=os.path.join(workdir, "token.dat"))
+        app.price_store = app.PriceStore(os.path.join(workdir, "prices.db"), source=self.prices)
+        app.exchanges_os = app.ExchangeResolver(os.path.join(workdir, "exchanges.json"), app.SYMBOL_EXCHANGE_OS)
+        app.events = app.EventLog(app.EVENT_LOG_SIZE)
+        app.notifier = None
+        app.QUOTE_FEED = args.quote_feed
+        if args.quote_feed:  # 실시간 시세 대역을 띄우고 전 종목 구독 (주문 단가를 REST 대신 시세표에서 읽음)
+            self.quote_server = mock_kis.QuoteStandIn(self.prices)
+            app.quotes = quote_feed.QuoteFeed(self.quote_server.start(), lambda: app.kis.approval_key(), app.QUOTE_MAX_AGE)
+            subs = [(quote_feed.KR_TRADE, c) for c in app.ASSETS_KR.values()]
+            subs += [(quote_feed.OS_TRADE, app.quote_key_os(s)) for s in list(app.UNIVERSE_OS) + [app.SAFE_ASSET_OS]]
+            app.engine.spawn("bench-quotes", app.start_quote_feed(subs)).result()
+            while len(app.quotes.quotes) < len(subs): time.sleep(0.05)  # 첫 시세가 모두 들어올 때까지
+
+    def _portfolio_kr(self):
+        """목표가 아닌 종목만 들고 시작 -> 한 번의 리밸런싱에 매도와 매수가 모두 일어남"""
+        app = self.app
+        safe = next(iter(app.SAFE_ASSET_KR.values()))
+        targets, _ = app.compute_signal([f"{c}.KS" for c in app.UNIVERSE_KR.values()], f"{safe}.KS")
+        return {c: 10 for c in app.ASSETS_KR.values() if f"{c}.KS" not in targets}
+
+    def _portfolio_os(self):
+        app = self.app
+        targets, _ = app.compute_signal(app.UNIVERSE_OS, app.SAFE_ASSET_OS)
+        return {s: 10 for s in list(app.UNIVERSE_OS) + [app.SAFE_ASSET_OS] if s not in targets}
+
+    def _cycles(self, rebalance, reset, rounds):
+        samples, calls = [], {}
+        for _ in range(rounds):
+            reset()
+            before = dict(self.broker.requests)
+            start = time.perf_counter()
+            rebalance()
+            samples.append(time.perf_counter() - start)
+            for label, n in self.broker.requests.items():
+                calls[label] = calls.get(label, 0) + n - before.get(label, 0)
+        return dict(_summary(samples), calls_per_cycle={k: v / rounds for k, v in sorted(calls.items()) if v})
+
+    def kr_cycle(self, rounds):
+        holdings = self._portfolio_kr()
+        return self._cycles(self.app.rebalance_kr, lambda: self.broker.reset(holdings_kr=holdings), rounds)
+
+    def os_cycle(self, rounds):
+        holdings = self._portfolio_os()
+        return self._cycles(self.app.rebalance_os, lambda: self.broker.reset(holdings_os=holdings), rounds)
+
+    def dashboard(self, clients, seconds):
+        """clients 개의 탭이 쉬지 않고 /status, /overseas_status 를 폴링할 때의 처리량"""
+        counts, latencies, deadline = [0] * clients, [], time.perf_counter() + seconds
+        lock = threading.Lock()
+
+        def poll(i):
+            client, mine = self.app.app.test_client(), []
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                client.get("/status" if counts[i] % 2 == 0 else "/overseas_status")
+                mine.append(time.perf_counter() - start)
+                counts[i] += 1
+            with lock: latencies.extend(mine)
+
+        threads = [threading.Thread(target=poll, args=(i,)) for i in range(clients)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        latencies.sort()
+        return {"clients": clients, "requests": sum(counts), "rps": sum(counts) / seconds,
+                "p50_ms": latencies[len(latencies) // 2] * 1000, "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000}
+
+
+def _compare(current, previous):
+    for name, result in current.items():
+        old = previous.get(name, {})
+        for key, value in result.items():
+            if isinstance(value, (int, float)) and isinstance(old.get(key), (int, float)) and old[key]:
+                print(f"  {name}.{key}: {old[key]:.4g} -> {value:.4g} ({(value / old[key] - 1) * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="리밸런싱/대시보드 성능 측정 (로컬 모의 서버)")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.02, help="모의 서버 요청당 지연(초)")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rps", type=int, default=0, help="모의 서버 초당 한도 (0 이면 무제한)")
+    parser.add_argument("--client-rps", type=float, default=20, help="KisClient 레이트리미터 초당 요청 수")
+    parser.add_argument("--fill-polls", type=int, default=0, help="체결까지 필요한 미체결 조회 횟수")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--clients", type=int, default=8, help="대시보드 동시 폴링 수")
+    parser.add_argument("--seconds", type=float, default=3.0, help="대시보드 측정 시간")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quote-feed", action="store_true", help="실시간 시세 대역(WebSocket)을 켜고 측정")
+    parser.add_argument("--only", choices=["kr", "os", "dashboard"], action="append")
+    parser.add_argument("--save", help="결과 JSON 저장 경로")
+    parser.add_argument("--compare", help="이전 결과 JSON 과 비교")
+    args = parser.parse_args()
+
+    import final_app
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        bench = Bench(final_app, args, workdir)
+        only = set(args.only or ["kr", "os", "dashboard"])
+        with contextlib.redirect_stdout(io.StringIO()):  # 매매 로그 출력은 숨김
+            if "kr" in only: results["kr_cycle"] = bench.kr_cycle(args.rounds)
+            if "os" in only: results["os_cycle"] = bench.os_cycle(args.rounds)
+            if "dashboard" in only: results["dashboard"] = bench.dashboard(args.clients, args.seconds)
+        bench.server.shutdown()
+
+    print(json.dumps(results, indent=1, ensure_ascii=False))
+    if args.compare:
+        with open(args.compare, encoding='UTF-8') as f:
+            print(f"\n{args.compare} 대비:")
+            _compare(results, json.load(f))
+    if args.save:
+        with open(args.save, 'w', encoding='UTF-8') as f:
+            json.dump(results, f, indent=1, ensure_ascii=False)
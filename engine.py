@@ -0,0 +1,55 @@
+"""매매 엔진: 이벤트 루프 하나에서 시장별 전략 루프와 계좌 스냅샷 갱신을 태스크로 돌린다.
+
+시장이나 전략이 늘어도 스레드가 늘지 않는다. 대기(장 시작까지, 체결 확인 간격)는 루프 위의 태스크가 하고,
+동기 I/O(KIS requests 세션, yfinance)는 엔진의 공용 실행기에서 돌린다.
+Flask 는 엔진이 갱신해 둔 상태만 읽는다.
+"""
+import asyncio
+import concurrent.futures
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Engine:
+    """max_workers: 공용 실행기 스레드 수. 오래 걸리는 동기 호출(체결 대기를 포함한 매매 사이클)이 동시에
+    몇 개까지 돌 수 있는지 세어 그보다 넉넉히 잡아야 짧은 호출(스냅샷 갱신 등)이 밀리지 않는다"""
+    def __init__(self, max_workers=4):
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="engine")
+        self.loop.set_default_executor(self.executor)
+        self.tasks = {}  # 이름 -> concurrent.futures.Future
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.loop.run_forever, name="engine", daemon=True)
+                self._thread.start()
+
+    def spawn(self, name, coro):
+        """코루틴을 엔진 루프의 태스크로 실행 (어느 스레드에서나 호출 가능) -> Future"""
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        self.tasks[name] = future
+        return future
+
+    def running(self, name):
+        future = self.tasks.get(name)
+        return future is not None and not future.done()
+
+    def join(self, name, timeout=None):
+        """태스크가 끝날 때까지 대기. timeout 안에 끝났으면 True"""
+        future = self.tasks.get(name)
+        if future is None: return True
+        return not concurrent.futures.wait([future], timeout).not_done
+
+    async def blocking(self, fn, *args):
+        """동기 함수를 공용 실행기에서 돌리고 결과를 기다림 (루프는 다른 태스크를 계속 처리)"""
+        return await self.loop.run_in_executor(self.executor, fn, *args)
+
+    def shutdown(self):
+        for future in self.tasks.values():
+            future.cancel()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.executor.shutdown(wait=False)
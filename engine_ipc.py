@@ -0,0 +1,93 @@
+"""매매 엔진 프로세스 <-> 웹 프로세스 IPC.
+
+엔진 프로세스(python final_app.py --engine)가 KIS 호출과 매매 루프를 모두 맡고, 상태 조회와 시작/정지 명령을
+로컬 소켓(multiprocessing.connection, authkey 인증)으로 받는다. 웹 프로세스는 상태를 들고 있지 않으므로
+WSGI 서버 워커를 여러 개 띄워도 매매 태스크가 중복으로 생기지 않는다.
+"""
+import threading
+from multiprocessing.connection import AuthenticationError, Client, Listener
+
+
+class EngineUnavailable(Exception):
+    """엔진 프로세스에 연결할 수 없거나 요청 처리 중 연결이 끊김"""
+
+
+def parse_address(text):
+    """'host:port' -> TCP 주소, 그 밖의 문자열 -> 유닉스 소켓 경로"""
+    host, sep, port = text.rpartition(":")
+    return (host or "127.0.0.1", int(port)) if sep else text
+
+
+class LocalEngine:
+    """엔진과 웹이 한 프로세스일 때 (ENGINE_ADDRESS 미설정): 처리 함수를 바로 부른다"""
+    def __init__(self, handlers):
+        self.handlers = handlers
+
+    def call(self, name, *args):
+        return self.handlers[name](*args)
+
+
+class EngineServer:
+    """엔진 프로세스 쪽. handlers: 이름 -> 함수. 연결마다 스레드 하나가 (이름, 인자) 요청을 차례로 처리한다"""
+    def __init__(self, address, authkey, handlers):
+        self.listener = Listener(parse_address(address), authkey=authkey)
+        self.handlers = handlers
+        self._closed = False
+
+    def serve_forever(self):
+        while not self._closed:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                continue  # 인증 실패, 접속 중 끊김, close() 후 종료
+            threading.Thread(target=self._serve, args=(conn,), name="engine-ipc", daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    name, args = conn.recv()
+                except (OSError, EOFError):
+                    return  # 웹 프로세스가 연결을 닫음
+                try:
+                    reply = ("ok", self.handlers[name](*args))
+                except Exception as e:
+                    reply = ("error", f"{type(e).__name__}: {e}")
+                try:
+                    conn.send(reply)
+                except OSError:
+                    return
+
+    def close(self):
+        self._closed = True
+        self.listener.close()
+
+
+class EngineClient:
+    """웹 프로세스 쪽. 요청마다 쉬고 있는 연결을 빌려 쓰고 돌려놓는다 (SSE 처럼 오래 기다리는 요청이 다른 요청을 막지 않음).
+    엔진이 재시작돼 끊긴 연결을 빌렸으면 새 연결로 한 번 더 시도한다."""
+    def __init__(self, address, authkey):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def call(self, name, *args):
+        for attempt in range(2):
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            pooled = conn is not None
+            try:
+                if conn is None:
+                    conn = Client(self.address, authkey=self.authkey)
+                conn.send((name, args))
+                status, result = conn.recv()
+            except (OSError, EOFError, AuthenticationError) as e:
+                if conn is not None: conn.close()
+                if pooled and attempt == 0: continue
+                raise EngineUnavailable(f"매매 엔진 연결 실패 ({e})") from e
+            with self._lock:
+                self._idle.append(conn)
+            if status == "error":
+                raise RuntimeError(result)
+            return result
@@ -1,16 +1,34 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request
 import threading
+import asyncio
+import collections
+from types import MappingProxyType
+import heapq
+import itertools
 import requests
+from requests.adapters import HTTPAdapter
+import argparse
 import json
+import os
+import pickle
 import datetime
 import time
+import sqlite3
 import yaml
-import yfinance as yf
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+
+from engine import Engine
+import engine_ipc
+import market_calendar
+import quote_feed
+import metrics
+# pandas / yfinance / strategy(numpy) 는 쓰는 함수 안에서 import 한다 (화면과 헬스체크가 데이터 스택 로딩을 기다리지 않음)
 
 app = Flask(__name__)
 
 # --- [1. 설정 로드] ---
-with open('config.yaml', encoding='UTF-8') as f:
+with open(os.environ.get('KIS_CONFIG', 'config.yaml'), encoding='UTF-8') as f:  # runner.py 는 계좌별 설정 파일을 넘김
     _cfg = yaml.load(f, Loader=yaml.FullLoader)
 
 APP_KEY = _cfg['APP_KEY']
@@ -19,159 +37,1066 @@ CANO = _cfg['CANO']
 ACNT_PRDT_CD = _cfg['ACNT_PRDT_CD']
 URL_BASE = _cfg['URL_BASE'].rstrip('/')
 DISCORD_URL = _cfg.get('DISCORD_WEBHOOK_URL', '')
+ACCOUNT = _cfg.get('ACCOUNT', '')  # 계좌 이름 (runner.py 로 여러 계좌를 돌릴 때 알림 구분용)
 BUY_AMOUNT_KR = _cfg.get('BUY_AMOUNT', 1000000)
+SNAPSHOT_TTL = _cfg.get('SNAPSHOT_TTL', 5)  # 계좌 스냅샷 캐시 유지 시간(초)
+PRICE_DB = _cfg.get('PRICE_DB', 'prices.db')  # 일봉 저장소 파일
+PRICE_REFRESH = _cfg.get('PRICE_REFRESH', 300)  # 같은 종목 재조회 최소 간격(초)
+EVENT_LOG_SIZE = _cfg.get('EVENT_LOG_SIZE', 5000)  # 메모리에 보관할 이벤트 수
+EVENT_LOG_PATH = _cfg.get('EVENT_LOG_PATH', '')  # 이벤트 JSONL 파일 (비우면 기록 안 함)
+TOKEN_FILE = _cfg.get('TOKEN_FILE', 'token.dat')  # 접근 토큰 캐시 (프로세스 간 공유)
+TOKEN_REFRESH_MARGIN = _cfg.get('TOKEN_REFRESH_MARGIN', 3600)  # 만료 몇 초 전에 미리 갱신할지
+FILL_TIMEOUT = _cfg.get('FILL_TIMEOUT', 600)  # 체결 대기 최대 시간(초), 넘으면 취소
+REPRICE_AFTER = _cfg.get('REPRICE_AFTER', 120)  # 이 시간(초)이 지나도 미체결이면 현재가로 정정
+KIS_RPS = _cfg.get('KIS_RPS', 2)  # KIS 초당 요청 한도 (모의투자 2건, 실전 20건 내외)
+WS_URL = _cfg.get('WS_URL', 'ws://ops.koreainvestment.com:31000')  # 실시간 시세 WebSocket (모의투자 31000, 실전 21000)
+QUOTE_FEED = _cfg.get('QUOTE_FEED', True)  # 실시간 시세 구독 사용 여부 (끄면 REST 로만 조회)
+QUOTE_MAX_AGE = _cfg.get('QUOTE_MAX_AGE', 10)  # 이보다 오래된 실시간 시세는 쓰지 않고 REST 로 조회(초)
+ENGINE_ADDRESS = _cfg.get('ENGINE_ADDRESS', '')  # 매매 엔진 프로세스 주소 ('host:port' 또는 소켓 경로, 비우면 웹과 한 프로세스)
+ENGINE_AUTHKEY = str(_cfg.get('ENGINE_AUTHKEY', APP_SECRET)).encode()  # 엔진 IPC 인증 키
+CHECKPOINT_PATH = _cfg.get('CHECKPOINT_PATH', 'engine_state.json')  # 엔진 상태 체크포인트 (비우면 저장/복원 안 함)
+CHECKPOINT_INTERVAL = _cfg.get('CHECKPOINT_INTERVAL', 30)  # 체크포인트 저장 간격(초)
 
-ACCESS_TOKEN = ""
-token_issued_time = None
-
-# 종목 설정
-ASSETS_KR = {"KODEX 200": "069500", "TIGER 나스닥100": "133690", "KODEX 국고채3년": "069660"}
+# 종목 설정 (config.yaml 에서 후보 종목/대피 자산/모멘텀 기간을 바꿀 수 있음)
+UNIVERSE_KR = _cfg.get('UNIVERSE_KR', {"KODEX 200": "069500", "TIGER 나스닥100": "133690"})  # 모멘텀 후보 {이름: 코드}
+SAFE_ASSET_KR = _cfg.get('SAFE_ASSET_KR', {"KODEX 국고채3년": "069660"})  # 대피 자산
+ASSETS_KR = {**UNIVERSE_KR, **SAFE_ASSET_KR}
 CODE_TO_NAME_KR = {v: k for k, v in ASSETS_KR.items()}
+UNIVERSE_OS = _cfg.get('UNIVERSE_OS', ["TQQQ", "EFA"])
+SAFE_ASSET_OS = _cfg.get('SAFE_ASSET_OS', "GLD")
+EXCHANGES_OS = ["NASD", "NYSE", "AMEX"]  # 잔고/미체결을 합산할 미국 거래소
+SYMBOL_EXCHANGE_OS = _cfg.get('SYMBOL_EXCHANGE_OS', {"TQQQ": "NASD", "EFA": "AMEX", "GLD": "AMEX"})  # 종목별 상장 거래소 (모르는 종목은 자동 조회)
+EXCHANGE_CACHE = _cfg.get('EXCHANGE_CACHE', 'exchanges.json')
+LOOKBACK = _cfg.get('LOOKBACK', 126)  # 모멘텀 기간(거래일, 약 6개월)
+TOP_K = _cfg.get('TOP_K', 1)  # 동시에 보유할 상위 종목 수
 
-bot_status = {"is_running": False, "log": [], "target": "-", "last_update": "-", "balance": 0}
-overseas_status = {"is_running": False, "log": [], "deposit": "0.00", "evlu_amt": "0.00", "total_asset": "0.00", "target": "-", "last_update": "-"}
 
 # --- [2. 유틸리티 함수: 장 시간 확인] ---
 
-def is_market_open_kr():
-    """국내 주식 시장 시간 확인 (09:00 ~ 15:20)"""
-    now = datetime.datetime.now()
-    if now.weekday() >= 5: return False # 주말
-    start_time = now.replace(hour=9, minute=0, second=0, microsecond=0)
-    end_time = now.replace(hour=15, minute=20, second=0, microsecond=0)
-    return start_time <= now <= end_time
-
-def is_market_open_os():
-    """미국 주식 시장 시간 확인 (23:30 ~ 06:00 KST 기준)"""
-    now = datetime.datetime.now()
-    # 평일 밤 11:30 ~ 다음날 새벽 06:00 (썸머타임 미고려 대략적 설정)
-    current_time = now.time()
-    open_time = datetime.time(23, 30)
-    close_time = datetime.time(6, 0)
-    
-    if current_time >= open_time or current_time <= close_time:
-        if now.weekday() < 5 or (now.weekday() == 5 and current_time <= close_time):
+# 거래소 달력 (시간대/서머타임/휴장일 반영) 과 세션 내 실행 시각 스케줄
+KRX = market_calendar.krx_calendar(_cfg.get('KRX_HOLIDAYS', []))
+NYSE = market_calendar.nyse_calendar()
+SCHEDULE_KR = market_calendar.MarketScheduler(KRX, **_cfg.get('SCHEDULE_KR', {}))
+SCHEDULE_OS = market_calendar.MarketScheduler(NYSE, **_cfg.get('SCHEDULE_OS', {}))
+
+class Clock:
+    """매매 루프가 쓰는 시계. 시뮬레이션(simulate.py)에서는 가상 시계로 바꿔 끼운다."""
+    def now(self):
+        return datetime.datetime.now(market_calendar.KST)
+
+    def local(self):
+        """시스템 시간대 기준 현재 시각 (로그/화면 표시용)"""
+        return self.now().astimezone().replace(tzinfo=None)
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def wait(self, event, seconds):
+        """seconds 동안 기다리되 event 가 켜지면 바로 True 반환"""
+        return event.wait(seconds)
+
+    async def sleep(self, event, seconds):
+        """wait 의 코루틴 버전 (엔진 루프를 막지 않고 0.5초 간격으로 event 확인)"""
+        deadline = time.monotonic() + seconds
+        while not event.is_set():
+            left = deadline - time.monotonic()
+            if left <= 0: return False
+            await asyncio.sleep(min(left, 0.5))
+        return True
+
+clock = Clock()
+# 시장별 매매 루프와 대시보드 스냅샷 갱신을 돌리는 이벤트 루프.
+# 매매 사이클은 체결 대기까지 실행기 스레드 하나를 통째로 잡으므로 시장 수(국내/해외 2)만큼은 따로 두고,
+# 나머지 4개로 스냅샷 갱신(2), 실시간 시세 승인키, 체크포인트 등 짧은 호출을 돌린다
+engine = Engine(max_workers=2 + 4)
+
+def now_kst():
+    return clock.now()
+
+def _record_cycle(market, start):
+    elapsed = time.perf_counter() - start
+    CYCLE_SECONDS.observe(elapsed, market=market)
+    CYCLE_LAST.set(elapsed, market=market)
+    CYCLE_LAST_END.set(time.time(), market=market)
+
+async def run_scheduled(schedule, cycle, stop, is_overseas=False):
+    """스케줄에 맞춰 cycle 을 실행하는 루프 (엔진 태스크). stop 이벤트가 켜지면 대기 중이어도 바로 빠져나온다.
+    시작 시점이 매매 구간 안이면 바로 한 번 실행한다. cycle 은 동기 함수라 엔진 실행기에서 돈다."""
+    run_now = schedule.in_window(now_kst())
+    while not stop.is_set():
+        if not run_now:
+            run_at = schedule.next_run(now_kst())
+            wait = (run_at - now_kst()).total_seconds()
+            if wait > 60:
+                log_msg(f"💤 다음 실행: {run_at.astimezone(market_calendar.KST):%m/%d %H:%M} (KST)", is_overseas, level="debug")
+            if await clock.sleep(stop, max(wait, 0)): break
+        run_now = False
+        market = "os" if is_overseas else "kr"
+        start = time.perf_counter()
+        try:
+            await engine.blocking(cycle)
+        except Exception as e:
+            _record_cycle(market, start)
+            ERRORS.inc(source=f"cycle_{market}")
+            log_msg(f"⚠️ {'해외' if is_overseas else '국내'} 에러: {e}", is_overseas, level="error", kind="error")
+            run_now = not await clock.sleep(stop, 60)  # 에러 후 1분 뒤 재시도
+            run_now = run_now and schedule.in_window(now_kst())
+        else:
+            _record_cycle(market, start)
+    log_msg(f"⏹ {'해외' if is_overseas else '국내'}주식 자동매매 쓰레드 종료", is_overseas)
+
+class MarketWorker:
+    """시장별 매매 태스크 수명 관리. 시작/정지를 잠금 안에서 처리해 엔진 위에 항상 태스크가 하나만 돌게 한다.
+    실행마다 새 stop 이벤트를 만들어 넘기므로, 정지된 이전 태스크가 다음 시작에 되살아나지 않는다."""
+    def __init__(self, name, target, state):
+        self.name = name
+        self.task_name = f"trading-{name}"
+        self.target = target  # async (stop 이벤트) -> None
+        self.state = state
+        self.stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if engine.running(self.task_name):
+                if not self.stop_event.is_set(): return False  # 이미 실행 중
+                if not engine.join(self.task_name, timeout=5): return False  # 정지 중인 이전 태스크가 끝나길 잠깐 기다림
+            self.stop_event = threading.Event()
+            self.state.update(is_running=True)
+            engine.spawn(self.task_name, self._run(self.stop_event))
             return True
-    return False
+
+    async def _run(self, stop):
+        """target 이 예외로 끝나도 '실행 중' 표시(와 체크포인트)가 남지 않게 정리"""
+        try:
+            await self.target(stop)
+        except Exception as e:
+            ERRORS.inc(source=f"task_{self.name}")
+            log_msg(f"⚠️ 매매 태스크 비정상 종료: {e}", self.name == "os", level="error", kind="error")
+        finally:
+            # 잠금을 잡지 않음: start() 가 잠금 안에서 이 태스크가 끝나길 기다릴 수 있음
+            if self.stop_event is stop and not stop.is_set():
+                stop.set()
+                self.state.update(is_running=False)
+
+    def join(self, timeout=None):
+        return engine.join(self.task_name, timeout)
+
+    def stop(self):
+        with self._lock:
+            self.stop_event.set()
+            self.state.update(is_running=False)
 
 # --- [3. 공통 함수] ---
 
-def log_msg(msg, is_overseas=False):
-    now = datetime.datetime.now().strftime('%H:%M:%S')
-    full_msg = f"[{now}] {msg}"
+# /metrics 로 노출하는 지표
+METRICS = metrics.Registry()
+KIS_LATENCY = METRICS.histogram("kis_request_seconds", "KIS API HTTP 왕복 시간 (재시도는 각각 기록)", ("tr_id",))
+KIS_ERRORS = METRICS.counter("kis_errors_total", "KIS API 오류 (reason=http|rate_limit|rt_cd)", ("tr_id", "reason"))
+KIS_RETRIES = METRICS.counter("kis_retries_total", "초당 한도 초과(EGW00201)로 인한 재시도", ("tr_id",))
+YF_LATENCY = METRICS.histogram("yfinance_download_seconds", "yfinance 일봉 다운로드 시간", ("ticker",))
+YF_ERRORS = METRICS.counter("yfinance_errors_total", "yfinance 다운로드 실패", ("ticker",))
+CYCLE_SECONDS = METRICS.histogram("trading_cycle_seconds", "리밸런싱 1회 소요 시간", ("market",), buckets=(1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+CYCLE_LAST = METRICS.gauge("trading_cycle_last_seconds", "마지막 리밸런싱 소요 시간", ("market",))
+CYCLE_LAST_END = METRICS.gauge("trading_cycle_last_end_timestamp", "마지막 리밸런싱 종료 시각 (unix time)", ("market",))
+ERRORS = METRICS.counter("app_errors_total", "처리 중 잡힌 예외 (source=발생 위치)", ("source",))
+CYCLE_SKIPPED = METRICS.counter("trading_cycle_skipped_total", "신호/잔고 변화가 없어 건너뛴 리밸런싱", ("market",))
+
+class SnapshotCache:
+    """계좌 스냅샷 공유 캐시.
+    화면(Flask)은 peek 으로 저장된 값만 읽고, 조회는 엔진의 refresh_snapshots 태스크가 한다.
+    최근 IDLE 초 안에 읽은 화면이 있고 TTL 이 지났을 때만 조회하므로, 아무도 보지 않으면 KIS 를 부르지 않는다."""
+    IDLE = 60
+
+    def __init__(self, fetch, ttl):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.value = None
+        self.fetched_at = 0.0
+        self.read_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fresh(self):
+        return self.value is not None and time.monotonic() - self.fetched_at < self.ttl
+
+    def wanted(self):
+        return not self._fresh() and time.monotonic() - self.read_at < self.IDLE
+
+    def refresh(self):
+        with self._lock:
+            if self._fresh(): return  # 대기하는 동안 이미 갱신됐으면 재조회 안 함
+            value = self.fetch()
+            if value is not None or self.value is None:
+                self.value = value or {}
+            self.fetched_at = time.monotonic()
+
+    def peek(self):
+        """(스냅샷, 경과 초) 반환. 네트워크 조회는 하지 않음 (아직 없으면 빈 dict)"""
+        self.read_at = time.monotonic()
+        if self.value is None: return {}, None
+        return self.value, round(time.monotonic() - self.fetched_at, 2)
+
+    def invalidate(self):
+        self.fetched_at = 0.0
+
+class StatusFeed:
+    """상태 변경분(delta) 저널. 버전 커서 이후의 변경만 골라 스트림으로 내보낸다."""
+    def __init__(self, maxlen=200):
+        self.version = 0
+        self._deltas = collections.deque(maxlen=maxlen)  # (version, delta)
+        self._cond = threading.Condition()
+
+    def publish(self, delta):
+        with self._cond:
+            self.version += 1
+            self._deltas.append((self.version, delta))
+            self._cond.notify_all()
+
+    def since(self, cursor, timeout):
+        """cursor 이후 delta 목록을 기다렸다가 (버전, delta 목록) 반환.
+        저널 범위를 벗어난 커서면 delta 목록 대신 None (전체 상태 재전송 필요)"""
+        with self._cond:
+            if cursor == self.version:
+                self._cond.wait(timeout)
+            if cursor < 0 or cursor > self.version or (self._deltas and self._deltas[0][0] > cursor + 1):
+                return self.version, None
+            return self.version, [d for v, d in self._deltas if v > cursor]
+
+FEEDS = {"kr": StatusFeed(), "os": StatusFeed()}
+
+class DiscordNotifier:
+    """디스코드 웹훅 비동기 전송기.
+    log_msg 는 큐에 넣기만 하고, 백그라운드 스레드가 여러 줄을 묶어 한 번에 보낸다.
+    큐가 가득 차면 중요도가 낮은 줄부터 버리고, 버린 줄 수는 다음 전송에 덧붙인다."""
+    MAX_CONTENT = 1900  # 디스코드 메시지 한도 2000자
+
+    def __init__(self, url, maxsize=500, batch_delay=1.0):
+        self.url = url
+        self.maxsize = maxsize
+        self.batch_delay = batch_delay
+        self.queue = collections.deque()  # (중요도 낮음 여부, 내용)
+        self.dropped = 0
+        self.session = requests.Session()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def send(self, text, low=False):
+        with self._cond:
+            if len(self.queue) >= self.maxsize:
+                victim = next((item for item in self.queue if item[0]), None)
+                if low or victim is None:
+                    self.dropped += 1
+                    if low: return
+                    self.queue.popleft()
+                else:
+                    self.queue.remove(victim)
+                    self.dropped += 1
+            self.queue.append((low, text))
+            self._cond.notify()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="discord", daemon=True)
+                self._thread.start()
+
+    def _take_batch(self):
+        with self._cond:
+            lines, size = [], 0
+            while self.queue and size + len(self.queue[0][1]) + 1 <= self.MAX_CONTENT:
+                text = self.queue.popleft()[1]
+                lines.append(text)
+                size += len(text) + 1
+            if not lines and self.queue:  # 한 줄이 한도보다 긴 경우
+                lines.append(self.queue.popleft()[1][:self.MAX_CONTENT])
+            if self.dropped:
+                lines.append(f"(전송 지연으로 {self.dropped}줄 생략)")
+                self.dropped = 0
+            return "\n".join(lines)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self.queue: self._cond.wait()
+            time.sleep(self.batch_delay)  # 잠깐 모아서 한 번에 전송
+            try:
+                self._post(self._take_batch())
+            except Exception:  # 예상 못 한 응답으로 전송 스레드가 죽으면 이후 알림이 영영 안 나감
+                ERRORS.inc(source="discord")
+
+    @staticmethod
+    def _retry_after(res):
+        """429 대기 시간 (헤더 -> JSON 본문 -> 1초). 앞단 프록시의 429 는 JSON 이 아닐 수 있음"""
+        try:
+            return float(res.headers.get("Retry-After") or res.json().get("retry_after", 1))
+        except (ValueError, AttributeError):
+            return 1.0
+
+    def _post(self, content):
+        for _ in range(5):
+            try:
+                res = self.session.post(self.url, json={"content": content}, timeout=5)
+            except requests.RequestException:
+                return
+            if res.status_code == 429:  # 레이트리밋: 안내된 시간만큼 쉬고 재전송
+                time.sleep(self._retry_after(res))
+                continue
+            if res.headers.get("X-RateLimit-Remaining") == "0":
+                time.sleep(float(res.headers.get("X-RateLimit-Reset-After", 1)))
+            return
+
+notifier = DiscordNotifier(DISCORD_URL) if DISCORD_URL else None
+
+class StateStore:
+    """시장별 상태 저장소.
+    현재 상태는 읽기 전용 스냅샷으로만 공개하고, 쓰기는 잠금 안에서 새 사본을 만들어 참조를 통째로 바꾼다.
+    읽는 쪽은 잠금 없이 snapshot() 한 번으로 일관된 상태를 얻는다."""
+    def __init__(self, initial, feed):
+        self._snapshot = MappingProxyType(dict(initial))
+        self.feed = feed
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        return self._snapshot
+
+    def update(self, **changes):
+        with self._lock:
+            self._snapshot = MappingProxyType({**self._snapshot, **changes})
+            self.feed.publish(changes)  # 잠금 안에서 발행해 스냅샷 순서와 delta 순서를 맞춤
+
+bot_status = StateStore({"is_running": False, "target": "-", "last_update": "-", "balance": 0}, FEEDS["kr"])
+overseas_status = StateStore({"is_running": False, "deposit": "0.00", "evlu_amt": "0.00", "total_asset": "0.00", "target": "-", "last_update": "-"}, FEEDS["os"])
+
+def set_status(is_overseas=False, **changes):
+    """상태 값을 바꾸고 스트림 구독자에게 변경분을 알림"""
+    (overseas_status if is_overseas else bot_status).update(**changes)
+
+class Checkpoint:
+    """엔진 상태 체크포인트 (JSON 파일).
+    collect() 결과가 지난 저장과 다를 때만 임시 파일에 쓰고 바꿔치기하므로, 쓰는 도중에 죽어도 이전 체크포인트가 남는다."""
+    def __init__(self, path, collect, interval=30):
+        self.path = path
+        self.collect = collect  # () -> JSON 으로 저장할 dict
+        self.interval = interval
+        self._last = None
+        self._lock = threading.Lock()
+
+    def save(self):
+        if not self.path: return
+        with self._lock:
+            try:
+                state = self.collect()
+                text = json.dumps(state, ensure_ascii=False, default=str)
+                if text == self._last: return
+                tmp = self.path + ".tmp"
+                with open(tmp, 'w', encoding='UTF-8') as f:
+                    json.dump(dict(state, saved_at=now_kst().isoformat(timespec='seconds')), f, ensure_ascii=False, default=str)
+                os.replace(tmp, self.path)
+                self._last = text
+            except Exception:
+                ERRORS.inc(source="checkpoint")
+
+    def load(self):
+        """저장된 상태 (없거나 깨졌으면 None)"""
+        if not self.path: return None
+        try:
+            with open(self.path, encoding='UTF-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    async def run(self):
+        """엔진 태스크: interval 초마다 저장"""
+        while True:
+            await asyncio.sleep(self.interval)
+            self.save()
+
+class EventLog:
+    """구조화된 이벤트 로그 (고정 크기 링버퍼 + 선택적 JSONL 파일 기록).
+    이벤트마다 1씩 늘어나는 seq 를 커서로 써서 특정 시점 이후의 이벤트만 조회할 수 있다."""
+    def __init__(self, maxlen, path=''):
+        self.events = collections.deque(maxlen=maxlen)
+        self.seq = 0
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        if path:
+            torn = False
+            try:
+                with open(path, encoding='UTF-8', errors='replace') as f:
+                    lines = collections.deque(f, maxlen=maxlen)
+                for line in lines:
+                    try:
+                        self.events.append(json.loads(line))
+                    except ValueError:
+                        pass  # 비정상 종료로 잘린 줄은 건너뜀
+                torn = bool(lines) and not lines[-1].endswith("\n")
+                if self.events: self.seq = max(e["seq"] for e in self.events)
+            except FileNotFoundError: pass
+            self._file = open(path, 'a', encoding='UTF-8', buffering=1)
+            if torn: self._file.write("\n")  # 잘린 줄 뒤에 이어 쓰지 않게
+
+    def append(self, market, level, kind, msg):
+        with self._lock:
+            self.seq += 1
+            event = {"seq": self.seq, "ts": clock.local().isoformat(timespec='seconds'), "market": market, "level": level, "type": kind, "msg": msg}
+            self.events.append(event)
+            if self._file: self._file.write(json.dumps(event, ensure_ascii=False) + "\n")
+        return event
+
+    def after(self, cursor, market=None, limit=200):
+        """cursor(seq) 이후 이벤트를 오래된 순으로 최대 limit 개"""
+        with self._lock:
+            events = [e for e in self.events if e["seq"] > cursor and (market is None or e["market"] == market)]
+        return events[:limit]
+
+    def recent(self, market, n=50):
+        """최근 n개 (최신순)"""
+        with self._lock:
+            out = []
+            for e in reversed(self.events):
+                if e["market"] == market:
+                    out.append(e)
+                    if len(out) >= n: break
+        return out
+
+events = EventLog(EVENT_LOG_SIZE, EVENT_LOG_PATH)
+
+def render_event(event):
+    return f"<div>[{event['ts'][11:]}] {event['msg']}</div>" # HTML 태그 포함
+
+def log_lines(market, n=50):
+    """대시보드용 최근 로그 (HTML, 최신순)"""
+    return [render_event(e) for e in events.recent(market, n)]
+
+def log_msg(msg, is_overseas=False, level="info", kind="system"):
+    """level: debug/info/warn/error, kind: system/signal/order/fill/error.
+    level="debug" 인 줄(장 마감 대기, 보유 유지 등)은 디스코드 전송이 밀리면 먼저 버려진다."""
+    market = "os" if is_overseas else "kr"
+    event = events.append(market, level, kind, msg)
+    full_msg = f"[{event['ts'][11:]}] {msg}"
     print(full_msg)
-    target = overseas_status if is_overseas else bot_status
-    target["log"].insert(0, f"<div>{full_msg}</div>") # HTML 태그 포함
-    if len(target["log"]) > 50: target["log"].pop()
-    if DISCORD_URL:
+    FEEDS[market].publish({"log": [render_event(event)]})
+    if notifier:
+        prefix = ("🇺🇸 " if is_overseas else "🇰🇷 ") + (f"[{ACCOUNT}] " if ACCOUNT else "")
+        notifier.send(prefix + full_msg, low=(level == "debug"))
+
+# 요청 우선순위 (숫자가 작을수록 먼저 처리)
+PRIO_ORDER, PRIO_BALANCE, PRIO_DASHBOARD = 0, 1, 2
+
+class RateLimiter:
+    """KIS 초당 거래건수 제한용 토큰 버킷.
+    기다리는 요청들은 우선순위 순서(같으면 먼저 온 순서)로 토큰을 받는다."""
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._cond = threading.Condition()
+        self._waiters = []  # (우선순위, 순번) 힙
+        self._seq = itertools.count()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, priority=PRIO_BALANCE):
+        with self._cond:
+            me = (priority, next(self._seq))
+            heapq.heappush(self._waiters, me)
+            try:
+                while True:
+                    if self._waiters[0] != me:
+                        self._cond.wait()  # 앞선 요청이 토큰을 받아 나가면 깨어남
+                        continue
+                    self._refill()
+                    wait = max(self.paused_until - time.monotonic(), (1 - self.tokens) / self.rate)
+                    if wait <= 0:
+                        self.tokens -= 1
+                        return
+                    self._cond.wait(wait)
+            finally:
+                self._waiters.remove(me)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def backoff(self, seconds):
+        """한도 초과 응답을 받으면 모든 요청을 잠시 멈춤"""
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+class FileLock:
+    """프로세스 간 잠금. lock 파일을 배타적으로 만드는 방식이라 OS에 상관없이 동작한다.
+    비정상 종료로 남은 lock 파일은 stale_sec 이 지나면 지운다."""
+    def __init__(self, path, stale_sec=30):
+        self.path = path
+        self.stale_sec = stale_sec
+        self.fd = None
+
+    def __enter__(self):
+        while True:
+            try:
+                self.fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > self.stale_sec:
+                        os.remove(self.path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        os.close(self.fd)
+        os.remove(self.path)
+
+class KisClient:
+    """KIS API 클라이언트.
+    keep-alive 세션의 연결 풀을 재사용하고, 인증 헤더 템플릿은 토큰이 바뀔 때만 새로 만든다."""
+    # 엔드포인트별 (연결, 응답) 타임아웃(초)
+    TIMEOUTS = {"/oauth2/tokenP": (3, 10), "/uapi/hashkey": (3, 3), "/order-cash": (3, 10), "/trading/order": (3, 10)}
+    DEFAULT_TIMEOUT = (3, 5)
+    RATE_LIMIT_CODE = "EGW00201"  # 초당 거래건수 초과
+    MAX_RETRY = 4
+
+    def __init__(self, url_base, app_key, app_secret, pool_size=10, rps=KIS_RPS, token_file=TOKEN_FILE):
+        self.url_base = url_base
+        self.app_key = app_key
+        self.app_secret = app_secret
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.app_headers = {"Content-Type": "application/json", "appKey": app_key, "appSecret": app_secret}
+        self.auth_headers = None
+        self.access_token = ""
+        self.token_expires = None
+        self.token_file = token_file
+        self._token_lock = threading.Lock()
+        self._refresher = None
+        self.limiter = RateLimiter(rps)
+
+    def timeout(self, path):
+        for suffix, t in self.TIMEOUTS.items():
+            if path.endswith(suffix): return t
+        return self.DEFAULT_TIMEOUT
+
+    @staticmethod
+    def _expiry(saved):
+        """만료 시각. KIS 는 access_token_token_expired 를 KST 벽시계 시각으로 준다 (서버 시간대와 무관)"""
+        return datetime.datetime.strptime(saved['access_token_token_expired'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=market_calendar.KST)
+
+    def _token_left(self, saved=None):
+        """토큰 남은 시간(초)"""
+        expires = self.token_expires if saved is None else self._expiry(saved)
+        return (expires - datetime.datetime.now(market_calendar.KST)).total_seconds() if expires else -1
+
+    def _load_token(self):
+        """token.dat 에 저장된 토큰 (같은 앱키로 발급된 것만)"""
         try:
-            prefix = "🇺🇸 " if is_overseas else "🇰🇷 "
-            requests.post(DISCORD_URL, json={"content": prefix + full_msg}, timeout=5)
-        except: pass
-
-def get_token():
-    global ACCESS_TOKEN, token_issued_time
-    if ACCESS_TOKEN and token_issued_time:
-        if (datetime.datetime.now() - token_issued_time).total_seconds() < 80000:
-            return ACCESS_TOKEN
-    headers = {"content-type": "application/json"}
-    body = {"grant_type": "client_credentials", "appkey": APP_KEY, "appsecret": APP_SECRET}
-    try:
-        res = requests.post(f"{URL_BASE}/oauth2/tokenP", headers=headers, data=json.dumps(body))
-        ACCESS_TOKEN = res.json()["access_token"]
-        token_issued_time = datetime.datetime.now()
-        return ACCESS_TOKEN
-    except Exception as e:
-        log_msg(f"토큰 발급 오류: {e}")
-    return None
+            with open(self.token_file, 'rb') as f:
+                saved = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return saved if saved.get('api_key') == self.app_key and saved.get('access_token') else None
+
+    def _issue_token(self):
+        body = {"grant_type": "client_credentials", "appkey": self.app_key, "appsecret": self.app_secret}
+        res = self.request("POST", "/oauth2/tokenP", data=body, auth=False, priority=PRIO_ORDER)
+        expired = res.get('access_token_token_expired') or (datetime.datetime.now(market_calendar.KST) + datetime.timedelta(seconds=int(res.get('expires_in', 86400)))).strftime('%Y-%m-%d %H:%M:%S')
+        saved = {'access_token': res['access_token'], 'access_token_token_expired': expired, 'token_type': res.get('token_type', 'Bearer'),
+                 'expires_in': res.get('expires_in'), 'timestamp': int(time.time()), 'api_key': self.app_key, 'api_secret': self.app_secret}
+        tmp = self.token_file + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(saved, f)
+        os.replace(tmp, self.token_file)  # 다른 프로세스가 반쯤 쓰인 파일을 읽지 않도록 교체
+        return saved
+
+    def get_token(self, force=False):
+        """접근 토큰. 스레드/프로세스가 동시에 요청해도 발급은 한 번만 일어난다.
+        force=True 면 만료 여유(TOKEN_REFRESH_MARGIN) 안쪽인 토큰을 새로 받는다."""
+        margin = TOKEN_REFRESH_MARGIN if force else 60
+        if self._token_left() > margin:
+            return self.access_token
+        try:
+            with self._token_lock, FileLock(self.token_file + '.lock'):
+                if self._token_left() <= margin:
+                    saved = self._load_token()
+                    if not saved or self._token_left(saved) <= margin:  # 다른 프로세스가 이미 갱신했으면 그대로 사용
+                        saved = self._issue_token()
+                    self.access_token = saved['access_token']
+                    self.token_expires = self._expiry(saved)
+                    self.auth_headers = dict(self.app_headers, authorization=f"Bearer {self.access_token}")
+        except Exception as e:
+            log_msg(f"토큰 발급 오류: {e}", level="error", kind="error")
+            return None
+        if self._refresher is None:
+            self._refresher = threading.Thread(target=self._refresh_loop, name="token-refresh", daemon=True)
+            self._refresher.start()
+        return self.access_token
+
+    def _refresh_loop(self):
+        """만료 TOKEN_REFRESH_MARGIN 초 전에 미리 갱신 (매매 중 첫 요청이 발급을 기다리지 않도록)"""
+        while True:
+            wait = self._token_left() - TOKEN_REFRESH_MARGIN
+            if wait > 0:
+                time.sleep(min(wait, 3600))  # 시계 변경에 대비해 최대 1시간마다 다시 계산
+            elif not self.get_token(force=True):
+                time.sleep(60)
+
+    def request(self, method, path, tr_id=None, params=None, data=None, auth=True, headers=None, priority=PRIO_BALANCE, with_headers=False):
+        """응답 JSON 반환 (with_headers=True 면 (JSON, 응답 헤더))"""
+        if auth and not self.get_token():
+            raise RuntimeError("접근 토큰 없음")
+        h = dict(self.auth_headers if auth else self.app_headers)
+        if tr_id: h["tr_id"] = tr_id
+        if headers: h.update(headers)
+        body = json.dumps(data) if data is not None else None
+        label = tr_id or path.rsplit("/", 1)[-1]  # tr_id 가 없는 토큰/해시키는 경로 끝으로 구분
+        for attempt in range(self.MAX_RETRY + 1):
+            self.limiter.acquire(priority)
+            try:
+                with KIS_LATENCY.time(tr_id=label):
+                    resp = self.session.request(method, self.url_base + path, headers=h, params=params, data=body, timeout=self.timeout(path))
+                    res = resp.json()
+            except (requests.RequestException, ValueError):
+                KIS_ERRORS.inc(tr_id=label, reason="http")
+                raise
+            if res.get("msg_cd") != self.RATE_LIMIT_CODE:
+                break
+            if attempt == self.MAX_RETRY:
+                KIS_ERRORS.inc(tr_id=label, reason="rate_limit")
+                break
+            KIS_RETRIES.inc(tr_id=label)
+            self.limiter.backoff(0.5 * 2 ** attempt)  # 한도 초과: 지수 백오프 후 재시도
+        if res.get("rt_cd") not in (None, "0"):
+            KIS_ERRORS.inc(tr_id=label, reason="rt_cd")
+        return (res, resp.headers) if with_headers else res
+
+    def pages(self, path, tr_id, params, ctx_keys, priority=PRIO_BALANCE, max_pages=100):
+        """연속조회 페이지를 차례로 내보냄.
+        응답 헤더 tr_cont 가 F/M(다음 페이지 있음)이면 ctx_keys(예: CTX_AREA_FK100/NK100) 커서를 채워 이어서 조회한다."""
+        params = dict(params)
+        tr_cont = ""
+        for _ in range(max_pages):
+            res, headers = self.request("GET", path, tr_id, params=params, headers={"tr_cont": tr_cont}, priority=priority, with_headers=True)
+            yield res
+            if res.get("rt_cd") != "0" or headers.get("tr_cont") not in ("F", "M"):
+                return
+            for key in ctx_keys:
+                params[key] = res.get(key.lower(), "")
+            tr_cont = "N"
+
+    def get(self, path, tr_id, params, priority=PRIO_BALANCE):
+        return self.request("GET", path, tr_id, params=params, priority=priority)
+
+    def post(self, path, tr_id, data, with_hashkey=False, priority=PRIO_ORDER):
+        headers = {"hashkey": self.hashkey(data, priority)} if with_hashkey else None
+        return self.request("POST", path, tr_id, data=data, headers=headers, priority=priority)
+
+    def hashkey(self, data, priority=PRIO_ORDER):
+        return self.request("POST", "/uapi/hashkey", data=data, auth=False, priority=priority)["HASH"]
+
+    def approval_key(self):
+        """실시간(WebSocket) 접속키"""
+        body = {"grant_type": "client_credentials", "appkey": self.app_key, "secretkey": self.app_secret}
+        return self.request("POST", "/oauth2/Approval", data=body, auth=False, priority=PRIO_ORDER)["approval_key"]
+
+kis = KisClient(URL_BASE, APP_KEY, APP_SECRET)
+quotes = quote_feed.QuoteFeed(WS_URL, lambda: kis.approval_key(), QUOTE_MAX_AGE, on_status=lambda msg: log_msg(msg, level="debug"))
+
+async def start_quote_feed(subscriptions):
+    """subscriptions [(tr_id, 키)] 를 구독하고, 구독 태스크가 없으면 엔진에 띄움"""
+    if not (QUOTE_FEED and quotes.available): return
+    for tr_id, key in subscriptions:
+        quotes.subscribe(tr_id, key)
+    if not engine.running("quotes"):
+        engine.spawn("quotes", quotes.run(engine.blocking))
+
+def yf_history(ticker, start=None):
+    """yfinance 일봉 종가 Series (start 가 없으면 최근 1년, PriceStore 는 항상 start 를 넘김)"""
+    import yfinance as yf
+    t = yf.Ticker(ticker)
+    return (t.history(start=start) if start else t.history(period="1y"))['Close']
+
+class PriceStore:
+    """일봉 종가 로컬 저장소 (SQLite, 종목+날짜 키).
+    마지막 저장일 이후의 봉만 source(기본 yfinance)에서 받아오고, 모멘텀/현재가는 로컬 데이터로 계산한다.
+    종목별 갱신 시각도 DB 에 남기고 종목별 파일 잠금 안에서 확인하므로, 같은 파일을 쓰는 계좌 프로세스끼리는 한 번만 받는다."""
+    def __init__(self, path, refresh_sec=PRICE_REFRESH, source=yf_history, seed_bars=LOOKBACK + 60):
+        self.path = path
+        self.refresh_sec = refresh_sec
+        self.source = source  # (종목, 시작일 또는 None) -> 날짜 인덱스 종가 Series
+        self.seed_bars = seed_bars  # 처음 보는 종목은 이만큼의 봉을 받아 둠
+        self._updated = {}  # 종목별 마지막 갱신 시각 (이 프로세스에서 본 값)
+        self._depth = {}  # 종목별로 이미 확인한 보관 봉 수 (ensure)
+        with self._connect() as con:
+            con.execute("CREATE TABLE IF NOT EXISTS daily (ticker TEXT, date TEXT, close REAL, PRIMARY KEY (ticker, date))")
+            con.execute("CREATE TABLE IF NOT EXISTS fetched (ticker TEXT PRIMARY KEY, at REAL)")  # 종목별 마지막 다운로드 (unix time)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def last_date(self, ticker):
+        with self._connect() as con:
+            return con.execute("SELECT MAX(date) FROM daily WHERE ticker = ?", (ticker,)).fetchone()[0]
+
+    def count(self, ticker):
+        with self._connect() as con:
+            return con.execute("SELECT COUNT(*) FROM daily WHERE ticker = ?", (ticker,)).fetchone()[0]
+
+    def _since(self, bars):
+        """bars 개 거래일을 덮는 시작일 (주말/휴장일 여유 포함)"""
+        return (now_kst().date() - datetime.timedelta(days=int(bars * 1.5) + 30)).isoformat()
+
+    def _download(self, ticker, start):
+        try:
+            with YF_LATENCY.time(ticker=ticker):
+                closes = self.source(ticker, start)
+        except Exception:
+            YF_ERRORS.inc(ticker=ticker)
+            raise
+        rows = [(ticker, d.strftime('%Y-%m-%d'), float(c)) for d, c in closes.dropna().items()]
+        with self._connect() as con:
+            con.executemany("INSERT OR REPLACE INTO daily VALUES (?, ?, ?)", rows)
+
+    def backfill(self, ticker, since):
+        """since(YYYY-MM-DD) 부터 다시 받아 앞쪽 기록을 채움"""
+        with FileLock(f"{self.path}.{ticker}.lock", stale_sec=120):
+            self._download(ticker, since)
+
+    def ensure(self, ticker, bars):
+        """저장된 봉이 bars 개보다 적으면 앞쪽을 더 받아 채움. 상장 기간이 짧아 더 없는 종목은 프로세스당 한 번만 시도"""
+        if bars <= self._depth.get(ticker, 0): return
+        if self.count(ticker) < bars:
+            self.backfill(ticker, self._since(bars))
+        self._depth[ticker] = max(self.count(ticker), bars)
+
+    def update(self, ticker):
+        """마지막 저장일부터 오늘까지 받아서 저장 (장중이면 오늘 봉을 최신 값으로 덮어씀)"""
+        if self._fresh(self._updated.get(ticker)):
+            return
+        with FileLock(f"{self.path}.{ticker}.lock", stale_sec=120):
+            with self._connect() as con:
+                row = con.execute("SELECT at FROM fetched WHERE ticker = ?", (ticker,)).fetchone()
+            if row and self._fresh(row[0]):  # 다른 프로세스가 방금 받아 둠
+                self._updated[ticker] = row[0]
+                return
+            self._download(ticker, self.last_date(ticker) or self._since(self.seed_bars))
+            now = clock.now().timestamp()
+            with self._connect() as con:
+                con.execute("INSERT OR REPLACE INTO fetched VALUES (?, ?)", (ticker, now))
+            self._updated[ticker] = now
+
+    def _fresh(self, fetched_at):
+        return fetched_at is not None and clock.now().timestamp() - fetched_at < self.refresh_sec
+
+    def closes(self, ticker, days, until=None):
+        """최근 days개 종가 (날짜 오름차순 Series). until(date) 을 주면 그 날짜까지의 봉만"""
+        import pandas as pd
+        with self._connect() as con:
+            rows = con.execute("SELECT date, close FROM daily WHERE ticker = ? AND date <= ? ORDER BY date DESC LIMIT ?",
+                               (ticker, until.isoformat() if until else "9999-12-31", days)).fetchall()
+        return pd.Series([c for _, c in reversed(rows)], index=pd.to_datetime([d for d, _ in reversed(rows)]), name=ticker)
 
-def hashkey(datas):
-    headers = {'content-Type': 'application/json', 'appKey': APP_KEY, 'appSecret': APP_SECRET}
-    res = requests.post(f"{URL_BASE}/uapi/hashkey", headers=headers, data=json.dumps(datas))
-    return res.json()["HASH"]
+    def latest_close(self, ticker):
+        self.update(ticker)
+        return float(self.closes(ticker, 1).iloc[-1])
+
+price_store = PriceStore(PRICE_DB)
+fetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="fetch")
+order_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="order")  # 주문 다리(leg) 병렬 처리
+
+class OrderTracker:
+    """제출한 주문의 체결 추적.
+    미체결 조회를 처음엔 짧게, 점점 길게(적응형 백오프) 반복하다가 목록에서 빠지면 체결로 본다.
+    REPRICE_AFTER 가 지나면 현재가로 한 번 정정하고, FILL_TIMEOUT 까지 남은 주문은 취소한다."""
+    def __init__(self, fetch_open, revise, is_overseas=False, on_fill=None):
+        self.fetch_open = fetch_open  # () -> {주문번호: 미체결 수량} (조회 실패 시 None)
+        self.revise = revise  # (주문, cancel) -> 정정된 주문 또는 None
+        self.is_overseas = is_overseas
+        self.on_fill = on_fill  # 체결 확인 시 호출 (잔고 메모 무효화)
+        self.pending = {}  # 체결을 기다리는 주문 (체크포인트용)
+
+    def pending_orders(self):
+        return list(dict(self.pending).values())
+
+    def wait_filled(self, orders, timeout=FILL_TIMEOUT, reprice_after=REPRICE_AFTER):
+        """(체결된 주문 목록, 취소된 주문 목록, 정지 요청으로 추적을 멈춰 아직 열려 있는 주문 목록) 반환"""
+        self.pending = pending = {o["odno"]: o for o in orders if o}
+        try:
+            return self._wait(pending, timeout, reprice_after)
+        finally:
+            self.pending = {}
+
+    def _wait(self, pending, timeout, reprice_after):
+        market = "os" if self.is_overseas else "kr"
+        filled, repriced = [], set()
+        started, delay = clock.monotonic(), 1.0
+        while pending and clock.monotonic() - started < timeout:
+            if clock.wait(workers[market].stop_event, delay):
+                return filled, [], list(pending.values())  # 정지 요청: 남은 주문은 그대로 두고 빠져나옴
+            delay = min(delay * 1.5, 15)
+            open_orders = self.fetch_open()
+            if open_orders is None: continue
+            for odno, order in list(pending.items()):
+                if odno not in open_orders:
+                    filled.append(pending.pop(odno))
+                    log_msg(f"🎯 체결 확인: {order['name']} {order['qty']}주 {'매수' if order['is_buy'] else '매도'}", self.is_overseas, kind="fill")
+                    if self.on_fill: self.on_fill()
+                elif odno not in repriced and clock.monotonic() - started > reprice_after:
+                    new = self.revise(order, False)
+                    if new:
+                        del pending[odno]
+                        pending[new["odno"]] = new
+                        repriced.add(new["odno"])
+                        delay = 1.0
+        cancelled = []
+        for order in pending.values():
+            self.revise(order, True)
+            cancelled.append(order)
+            log_msg(f"🚫 미체결 취소: {order['name']} {order['qty']}주", self.is_overseas, level="warn", kind="order")
+        return filled, cancelled, []
+
+def sells_settled(tracker, sold, is_overseas=False):
+    """매도 체결을 기다린 뒤 매수해도 되는지. 정지 요청이 왔거나 취소/미체결로 남은 매도가 있으면 False"""
+    _, cancelled, left = tracker.wait_filled(sold) if any(sold) else ([], [], [])
+    if workers["os" if is_overseas else "kr"].stop_event.is_set():
+        return False
+    if cancelled or left:
+        log_msg(f"⏸ 매도 {len(cancelled) + len(left)}건이 체결되지 않아 이번 매수는 건너뜀", is_overseas, level="warn", kind="order")
+        return False
+    return True
+
+resume_pending = {}  # 시장 -> 재시작 전 체결을 기다리던 주문 (체크포인트에서 복원)
+
+async def resume_orders(market, tracker):
+    """재시작 전 체결을 기다리던 주문이 있으면 먼저 마저 추적 (체결 전에 다시 매수하지 않게)"""
+    orders = resume_pending.pop(market, None)
+    if orders:
+        log_msg(f"♻️ 재시작 전 미체결 주문 {len(orders)}건 체결 확인", market == "os", kind="order")
+        try:
+            await engine.blocking(tracker.wait_filled, orders)
+        except Exception as e:  # 미체결 조회 실패: 스케줄 루프는 그대로 시작 (남은 주문은 다음 사이클 잔고에 반영됨)
+            ERRORS.inc(source=f"resume_{market}")
+            log_msg(f"⚠️ 재시작 전 주문 확인 실패: {e}", market == "os", level="error", kind="error")
+
+def compute_signal(symbols, safe_symbol, lookback=LOOKBACK, top_k=TOP_K, until=None):
+    """후보 종목 일봉을 병렬로 갱신하고 모멘텀을 한 번에 계산 (until 을 주면 그 날짜까지의 봉만 사용).
+    (목표 비중 {종목: 비중}, 종목별 수익률 Series) 반환"""
+    import pandas as pd
+    import strategy
+    list(fetch_pool.map(lambda sym: (price_store.update(sym), price_store.ensure(sym, lookback)), symbols))
+    series = [price_store.closes(sym, lookback, until) for sym in symbols]
+    short = [f"{s.name} {len(s)}개" for s in series if len(s) < lookback]
+    if short:
+        raise ValueError(f"일봉이 모자라 {lookback}일 모멘텀을 계산할 수 없음 ({', '.join(short)})")
+    closes = pd.concat(series, axis=1)
+    rets = strategy.momentum(closes, lookback)
+    weights = strategy.target_weights(rets.values, top_k)
+    targets = {sym: float(w) for sym, w in zip(list(symbols) + [safe_symbol], weights) if w > 0}
+    return targets, rets
+
+class SignalCache:
+    """거래일 단위 신호 메모.
+    목표는 확정된 일봉으로만 정해지므로 (후보, 대피 자산, 기간, top_k, 마지막 확정 일봉 날짜) 가 같으면
+    일봉을 다시 받거나 모멘텀을 다시 계산하지 않는다. 새 봉이 확정되면 키가 바뀌어 자연히 다시 계산한다."""
+    def __init__(self, calendar):
+        self.calendar = calendar
+        self.key = None
+        self.value = None
+        self._lock = threading.Lock()
+
+    def get(self, symbols, safe_symbol, lookback=LOOKBACK, top_k=TOP_K):
+        """(키, (목표 비중, 수익률)) 반환"""
+        bar = self.calendar.last_session_date(now_kst())
+        key = (tuple(symbols), safe_symbol, lookback, top_k, bar)
+        with self._lock:
+            if key != self.key:
+                value = compute_signal(symbols, safe_symbol, lookback, top_k, until=bar)
+                price_store.update(safe_symbol)  # 대피 자산 단가도 하루 한 번 로컬에 받아 둠
+                # 저장소에 아직 그날 봉이 없으면(데이터 지연) 메모하지 않고 다음 사이클에 다시 받음
+                if all((price_store.last_date(sym) or "") >= bar.isoformat() for sym in symbols):
+                    self.key = key
+                self.value = value
+            return key, self.value
+
+    def dump(self):
+        """체크포인트용 (메모된 신호가 없으면 None)"""
+        if self.key is None: return None
+        symbols, safe_symbol, lookback, top_k, bar = self.key
+        targets, rets = self.value
+        return {"symbols": list(symbols), "safe": safe_symbol, "lookback": lookback, "top_k": top_k, "bar": bar.isoformat(),
+                "targets": targets, "returns": {sym: float(r) for sym, r in rets.items()}}
+
+    def restore(self, saved):
+        """dump 결과로 메모 복원. 수익률은 items() 로만 쓰므로 dict 그대로 둔다 (복원에 pandas 불필요)"""
+        with self._lock:
+            self.key = (tuple(saved["symbols"]), saved["safe"], saved["lookback"], saved["top_k"], datetime.date.fromisoformat(saved["bar"]))
+            self.value = (saved["targets"], saved["returns"])
+
+    def invalidate(self):
+        self.key = None
+
+class CycleMemo:
+    """시장별 '할 일 없음' 기억.
+    마지막 사이클이 목표대로 보유 중으로 끝났을 때의 (신호 키, 주문가능 금액)을 저장한다.
+    다음 사이클에서 신호 키와 주문가능 금액(값싼 조회 1건)이 그대로면 잔고 전체 조회 없이 끝낸다.
+    보유 종목은 잔고 전체 조회로만 알 수 있으므로 따로 비교하지 않고, 주문가능 금액을 보유 변화의 대용으로 쓴다
+    (봇 밖에서 사고팔면 금액이 바뀐다). 주문 접수/체결이 생기면 지운다."""
+    def __init__(self):
+        self.state = None
+
+    def settle(self, key, cash):
+        self.state = (key, cash)
+
+    def unchanged(self, key, cash):
+        return cash is not None and self.state == (key, cash)
+
+    def invalidate(self):
+        self.state = None
 
 # --- [4. 국내 주식 로직] ---
 
-def get_balance_kr():
-    token = get_token()
-    headers = {"Content-Type": "application/json", "authorization": f"Bearer {token}", "appKey": APP_KEY, "appSecret": APP_SECRET, "tr_id": "VTTC8908R"}
+def get_balance_kr(priority=PRIO_BALANCE, default=0):
+    """주문가능 현금 (조회 실패 시 default)"""
     params = {"CANO": CANO, "ACNT_PRDT_CD": ACNT_PRDT_CD, "PDNO": "005930", "ORD_UNPR": "0", "ORD_DVSN": "01", "CMA_EVLU_AMT_ICLD_YN": "Y", "OVRS_ICLD_YN": "Y"}
     try:
-        res = requests.get(f"{URL_BASE}/uapi/domestic-stock/v1/trading/inquire-psbl-order", headers=headers, params=params)
-        return int(res.json()['output']['ord_psbl_cash'])
-    except: return 0
+        res = kis.get("/uapi/domestic-stock/v1/trading/inquire-psbl-order", "VTTC8908R", params, priority)
+        return int(res['output']['ord_psbl_cash'])
+    except Exception:
+        ERRORS.inc(source="balance_kr")
+        return default
 
-def trade_order_kr(code, qty, is_buy=True):
-    token = get_token()
-    tr_id = "VTTC0802U" if is_buy else "VTTC0801U"
-    # 현재가 조회
-    headers_p = {"Content-Type": "application/json", "authorization": f"Bearer {token}", "appKey": APP_KEY, "appSecret": APP_SECRET, "tr_id": "FHKST01010100"}
+def iter_holdings_kr(priority=PRIO_BALANCE):
+    """국내 잔고 보유 종목을 모든 페이지에 걸쳐 하나씩 내보냄"""
+    params = {"CANO": CANO, "ACNT_PRDT_CD": ACNT_PRDT_CD, "AFHR_FLPR_YN": "N", "OFL_YN": "N", "INQR_DVSN": "02", "UNPR_DVSN": "01", "FUND_STTL_ICLD_YN": "N", "FNCG_AMT_AUTO_RDPT_YN": "N", "PRCS_DVSN": "00", "CTX_AREA_FK100": "", "CTX_AREA_NK100": ""}
+    for page in kis.pages("/uapi/domestic-stock/v1/trading/inquire-balance", "VTTC8434R", params, ("CTX_AREA_FK100", "CTX_AREA_NK100"), priority):
+        if page.get("rt_cd") != "0":
+            raise RuntimeError(f"잔고 조회 실패: {page.get('msg1')}")
+        yield from page.get("output1", [])
+
+def quote_kr(code):
+    """현재가 조회 (실시간 시세가 신선하면 그 값, 아니면 REST)"""
+    live = quotes.price(quote_feed.KR_TRADE, code)
+    if live: return int(live)
     params_p = {"FID_COND_MRKT_DIV_CODE": "J", "FID_INPUT_ISCD": code}
-    res_p = requests.get(f"{URL_BASE}/uapi/domestic-stock/v1/quotations/inquire-price", headers=headers_p, params=params_p)
-    curr_price = res_p.json()['output']['stck_prpr']
+    res_p = kis.get("/uapi/domestic-stock/v1/quotations/inquire-price", "FHKST01010100", params_p, PRIO_ORDER)
+    return int(res_p['output']['stck_prpr'])
+
+def quote_many_kr(codes):
+    """여러 종목 현재가를 한 번에 병렬 조회 -> {코드: 가격}"""
+    codes = list(dict.fromkeys(codes))
+    return dict(zip(codes, order_pool.map(quote_kr, codes)))
+
+def trade_order_kr(code, qty, is_buy=True, price=None):
+    """price 를 미리 조회해 넘기면 시세 조회 왕복을 건너뛴다. 접수되면 체결 추적용 주문 정보를 반환."""
+    tr_id = "VTTC0802U" if is_buy else "VTTC0801U"
+    curr_price = price or quote_kr(code)
 
     data = {"CANO": CANO, "ACNT_PRDT_CD": ACNT_PRDT_CD, "PDNO": code, "ORD_DVSN": "00", "ORD_QTY": str(int(qty)), "ORD_UNPR": str(curr_price)}
-    headers = {"Content-Type": "application/json", "authorization": f"Bearer {token}", "appKey": APP_KEY, "appSecret": APP_SECRET, "tr_id": tr_id, "hashkey": hashkey(data)}
-    res = requests.post(f"{URL_BASE}/uapi/domestic-stock/v1/trading/order-cash", headers=headers, data=json.dumps(data))
-    
+    res = kis.post("/uapi/domestic-stock/v1/trading/order-cash", tr_id, data, with_hashkey=True)
+
+    kr_snapshot.invalidate()
+    kr_memo.invalidate()
     action = "매수" if is_buy else "매도"
-    if res.json().get("rt_cd") == "0":
-        log_msg(f"✅ [국내] {CODE_TO_NAME_KR.get(code, code)} {qty}주 {action} 주문 성공")
-    else:
-        log_msg(f"❌ [국내] {action} 실패: {res.json().get('msg1')}")
+    if res.get("rt_cd") == "0":
+        log_msg(f"✅ [국내] {CODE_TO_NAME_KR.get(code, code)} {qty}주 {action} 주문 성공", kind="order")
+        out = res.get("output", {})
+        return {"odno": out.get("ODNO", "").lstrip("0"), "orgno": out.get("KRX_FWDG_ORD_ORGNO", ""), "code": code,
+                "name": CODE_TO_NAME_KR.get(code, code), "qty": int(qty), "price": curr_price, "is_buy": is_buy}
+    log_msg(f"❌ [국내] {action} 실패: {res.get('msg1')}", level="error", kind="order")
+    return None
 
-def trading_logic_kr():
-    log_msg("🚀 국내주식 자동매매 쓰레드 가동")
-    while bot_status["is_running"]:
-        if not is_market_open_kr():
-            log_msg("💤 국내 시장이 닫혀 있습니다. (09:00~15:20 대기)")
-            time.sleep(600)
-            continue
+def open_orders_kr():
+    """오늘 미체결 주문 {주문번호: 잔량}"""
+    today = now_kst().strftime('%Y%m%d')
+    params = {"CANO": CANO, "ACNT_PRDT_CD": ACNT_PRDT_CD, "INQR_STRT_DT": today, "INQR_END_DT": today, "SLL_BUY_DVSN_CD": "00", "INQR_DVSN": "00", "PDNO": "",
+              "CCLD_DVSN": "02", "ORD_GNO_BRNO": "", "ODNO": "", "INQR_DVSN_3": "00", "INQR_DVSN_1": "", "CTX_AREA_FK100": "", "CTX_AREA_NK100": ""}
+    res = kis.get("/uapi/domestic-stock/v1/trading/inquire-daily-ccld", "VTTC8001R", params, PRIO_ORDER)
+    if res.get("rt_cd") != "0": return None
+    return {o['odno'].lstrip("0"): int(o.get('rmn_qty') or 0) for o in res.get('output1', []) if int(o.get('rmn_qty') or 0) > 0}
 
-        try:
-            token = get_token()
-            bot_status["last_update"] = datetime.datetime.now().strftime('%H:%M:%S')
-            
-            # 6개월 모멘텀 계산
-            df_k = yf.Ticker("069500.KS").history(period="7mo")
-            df_u = yf.Ticker("133690.KS").history(period="7mo")
-            ret_k = (df_k['Close'].iloc[-1] / df_k['Close'].iloc[-126]) - 1
-            ret_u = (df_u['Close'].iloc[-1] / df_u['Close'].iloc[-126]) - 1
-            
-            target_name = ("KODEX 200" if ret_k > ret_u else "TIGER 나스닥100") if max(ret_k, ret_u) > 0 else "KODEX 국고채3년"
-            target_code = ASSETS_KR[target_name]
-            bot_status["target"] = target_name
-            log_msg(f"분석완료: {target_name} 선정 (국장:{ret_k*100:.1f}%, 미장:{ret_u*100:.1f}%)")
-
-            # 잔고 확인
-            headers_b = {"Content-Type": "application/json", "authorization": f"Bearer {token}", "appKey": APP_KEY, "appSecret": APP_SECRET, "tr_id": "VTTC8434R"}
-            params_b = {"CANO": CANO, "ACNT_PRDT_CD": ACNT_PRDT_CD, "AFHR_FLPR_YN": "N", "OFL_YN": "N", "INQR_DVSN": "02", "UNPR_DVSN": "01", "FUND_STTL_ICLD_YN": "N", "FNCG_AMT_AUTO_RDPT_YN": "N", "PRCS_DVSN": "00", "CTX_AREA_FK100": "", "CTX_AREA_NK100": ""}
-            res_b = requests.get(f"{URL_BASE}/uapi/domestic-stock/v1/trading/inquire-balance", headers=headers_b, params=params_b).json()
-            
-            # 매도
-            for s in res_b.get('output1', []):
-                qty = int(s['hldg_qty'])
-                if s['pdno'] != target_code and qty > 0:
-                    log_msg(f"♻️ 교체 매도: {s['prdt_name']} {qty}주")
-                    trade_order_kr(s['pdno'], qty, False)
-                    time.sleep(2)
-
-            # 매수
-            is_holding = any(s['pdno'] == target_code for s in res_b.get('output1', []))
-            if not is_holding:
-                cash = get_balance_kr()
-                curr_p = int(yf.Ticker(f"{target_code}.KS").history(period="1d")['Close'].iloc[-1])
-                qty = int(min(cash, BUY_AMOUNT_KR) / curr_p)
-                if qty > 0:
-                    log_msg(f"🛒 신규 매수: {target_name} {qty}주 시도 (예수금: {cash}원)")
-                    trade_order_kr(target_code, qty, True)
-                else:
-                    log_msg(f"⚠️ 매수 불가: 예수금({cash}원)이 부족하거나 단가가 높음")
-            else:
-                log_msg(f"✅ 유지: {target_name} 이미 보유 중")
+def revise_order_kr(order, cancel=False):
+    """미체결 주문을 현재가로 정정(잔량 전부)하거나 취소"""
+    price = 0 if cancel else quote_kr(order["code"])
+    data = {"CANO": CANO, "ACNT_PRDT_CD": ACNT_PRDT_CD, "KRX_FWDG_ORD_ORGNO": order["orgno"], "ORGN_ODNO": order["odno"], "ORD_DVSN": "00",
+            "RVSE_CNCL_DVSN_CD": "02" if cancel else "01", "ORD_QTY": "0", "ORD_UNPR": str(price), "QTY_ALL_ORD_YN": "Y"}
+    res = kis.post("/uapi/domestic-stock/v1/trading/order-rvsecncl", "VTTC0803U", data, with_hashkey=True)
+    if res.get("rt_cd") != "0" or cancel: return None
+    log_msg(f"✏️ 정정 주문: {order['name']} {order['price']} -> {price}원", kind="order")
+    return dict(order, odno=res.get("output", {}).get("ODNO", "").lstrip("0"), price=price)
+
+kr_signal = SignalCache(KRX)
+kr_memo = CycleMemo()
+kr_tracker = OrderTracker(open_orders_kr, revise_order_kr, on_fill=kr_memo.invalidate)
+
+def rebalance_kr():
+    """국내 리밸런싱 1회: 모멘텀 분석 -> 교체 매도 -> 신규 매수"""
+    set_status(last_update=clock.local().strftime('%H:%M:%S'))
+
+    # 6개월 모멘텀 계산 (확정 일봉 기준이라 거래일마다 한 번만 계산)
+    safe_code = next(iter(SAFE_ASSET_KR.values()))
+    key, (weights, rets) = kr_signal.get([f"{c}.KS" for c in UNIVERSE_KR.values()], f"{safe_code}.KS")
+    targets = {sym.split('.')[0]: w for sym, w in weights.items()}  # {종목코드: 비중}
+    target_name = ", ".join(CODE_TO_NAME_KR[c] for c in targets)
+
+    # 신호와 주문가능 현금이 지난번 '유지' 때와 같으면 잔고 조회 없이 끝냄
+    cash = get_balance_kr(default=None)
+    if kr_memo.unchanged(key, cash):
+        CYCLE_SKIPPED.inc(market="kr")
+        return
+    set_status(target=target_name)
+    detail = ", ".join(f"{CODE_TO_NAME_KR[sym.split('.')[0]]}:{r*100:.1f}%" for sym, r in rets.items())
+    log_msg(f"분석완료: {target_name} 선정 ({detail})", kind="signal")
+
+    # 잔고 확인 (전체 페이지, 종목코드로 색인)
+    holdings = {s['pdno']: s for s in iter_holdings_kr() if int(s['hldg_qty']) > 0}
+    sells = [s for code, s in holdings.items() if code not in targets]
+    to_buy = [c for c in targets if c not in holdings]
 
-            time.sleep(3600)
-        except Exception as e: log_msg(f"⚠️ 국내 에러: {e}"); time.sleep(60)
+    # 매도/매수 모든 종목의 현재가를 한 번에 병렬 조회
+    prices = quote_many_kr([s['pdno'] for s in sells] + to_buy) if sells or to_buy else {}
+
+    # 매도 (서로 독립이므로 동시에 제출, 속도는 레이트리미터가 조절)
+    for s in sells:
+        log_msg(f"♻️ 교체 매도: {s['prdt_name']} {s['hldg_qty']}주", kind="order")
+    sold = list(order_pool.map(lambda s: trade_order_kr(s['pdno'], int(s['hldg_qty']), False, prices[s['pdno']]), sells))
+    if to_buy and not sells_settled(kr_tracker, sold):  # 매도 체결을 확인한 뒤 확보된 예수금으로 매수
+        return
+
+    # 매수 (매도가 있었으면 확보된 예수금을 다시 조회)
+    if to_buy and (any(sold) or cash is None):
+        cash = get_balance_kr()
+    buys = []
+    for target_code in to_buy:
+        name = CODE_TO_NAME_KR[target_code]
+        curr_p = prices[target_code]
+        qty = int(min(cash, BUY_AMOUNT_KR * targets[target_code]) / curr_p)
+        if qty > 0:
+            log_msg(f"🛒 신규 매수: {name} {qty}주 시도 (예수금: {cash}원)", kind="order")
+            buys.append((target_code, qty))
+            cash -= qty * curr_p
+        else:
+            log_msg(f"⚠️ 매수 불가: 예수금({cash}원)이 부족하거나 단가가 높음", level="warn", kind="order")
+    bought = list(order_pool.map(lambda b: trade_order_kr(b[0], b[1], True, prices[b[0]]), buys))
+    if any(bought):
+        kr_tracker.wait_filled(bought)
+    if not sells and not to_buy:
+        kr_memo.settle(key, cash)
+    if not to_buy:
+        log_msg(f"✅ 유지: {target_name} 이미 보유 중", level="debug")
+
+async def trading_logic_kr(stop):
+    log_msg("🚀 국내주식 자동매매 쓰레드 가동")
+    year = now_kst().astimezone(market_calendar.KST).year
+    missing = market_calendar.krx_missing_years(_cfg.get('KRX_HOLIDAYS', []), (year, year + 1))
+    if missing:  # 설/추석 휴장일에 장이 열린 줄 알고 주문을 내지 않게 미리 알림
+        log_msg(f"⚠️ {', '.join(map(str, missing))}년 KRX 휴장일 정보 없음: config.yaml 의 KRX_HOLIDAYS 에 추가하거나 holidays 패키지를 설치하세요", level="warn")
+    await start_quote_feed([(quote_feed.KR_TRADE, code) for code in ASSETS_KR.values()])
+    await resume_orders("kr", kr_tracker)
+    await run_scheduled(SCHEDULE_KR, rebalance_kr, stop)
 
 # --- [5. 해외 주식 로직] ---
 
@@ -183,95 +1108,323 @@ def calculate_real_evlu(holdings):
         total_evlu += (qty * price)
     return total_evlu
 
+class ExchangeResolver:
+    """해외 종목 -> 거래소 코드(NASD/NYSE/AMEX).
+    설정값, 잔고에서 본 값, 이전 조회 결과를 파일에 캐시하고, 처음 보는 종목은 세 거래소 시세를 동시에 조회해 찾는다."""
+    PRICE_EXCD = {"NASD": "NAS", "NYSE": "NYS", "AMEX": "AMS"}  # 시세 API 의 거래소 코드
+
+    def __init__(self, path, seed):
+        self.path = path
+        self.map = dict(seed)
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding='UTF-8') as f:
+                self.map.update(json.load(f))
+        except (OSError, ValueError): pass
+
+    def learn(self, symbol, exchange):
+        if exchange in self.PRICE_EXCD and self.map.get(symbol) != exchange:
+            with self._lock:
+                self.map[symbol] = exchange
+                with open(self.path, 'w', encoding='UTF-8') as f:
+                    json.dump(self.map, f, ensure_ascii=False, indent=1)
+
+    def _probe(self, symbol, exchange):
+        params = {"AUTH": "", "EXCD": self.PRICE_EXCD[exchange], "SYMB": symbol}
+        res = kis.get("/uapi/overseas-price/v1/quotations/price", "HHDFS00000300", params)
+        return exchange if (res.get("output") or {}).get("last") else None
+
+    def resolve(self, symbol):
+        if symbol not in self.map:
+            found = [e for e in fetch_pool.map(lambda e: self._probe(symbol, e), EXCHANGES_OS) if e]
+            self.learn(symbol, found[0] if found else "NASD")
+        return self.map.get(symbol, "NASD")
+
+exchanges_os = ExchangeResolver(EXCHANGE_CACHE, SYMBOL_EXCHANGE_OS)
+
+def _balance_exchange_os(exchange, priority):
+    """한 거래소의 해외 잔고 전체 페이지 -> ({종목: 보유내역}, 요약). 조회 실패 시 None"""
+    params = {"CANO": CANO, "ACNT_PRDT_CD": ACNT_PRDT_CD, "OVRS_EXCG_CD": exchange, "TR_CRCY_CD": "USD", "WCRC_FRCR_DVSN_CD": "02", "CTX_AREA_FK200": "", "CTX_AREA_NK200": ""}
+    holdings, summary = {}, None
+    for page in kis.pages("/uapi/overseas-stock/v1/trading/inquire-balance", "VTTT3012R", params, ("CTX_AREA_FK200", "CTX_AREA_NK200"), priority):
+        if page.get("rt_cd") != "0": return None
+        if summary is None: summary = page.get("output2") or {}
+        holdings.update((h['ovrs_pdno'], dict(h, ovrs_excg_cd=h.get('ovrs_excg_cd') or exchange)) for h in page.get("output1", []) if float(h.get('ovrs_cblc_qty', 0)) > 0)
+    return holdings, summary or {}
+
+def get_balance_os(priority=PRIO_BALANCE):
+    """NASD/NYSE/AMEX 잔고를 동시에 조회해 하나로 합침 -> ({종목: 보유내역}, 요약).
+    한 거래소라도 실패하면 보유 종목을 놓칠 수 있으므로 None"""
+    results = list(fetch_pool.map(lambda e: _balance_exchange_os(e, priority), EXCHANGES_OS))
+    if any(r is None for r in results): return None
+    holdings, summary = {}, {}
+    for part, part_summary in results:
+        holdings.update(part)
+        if not (summary.get('frcr_dncl_amt_2') or summary.get('frcr_pchs_amt1')): summary = part_summary or summary
+    for sym, h in holdings.items():
+        exchanges_os.learn(sym, h['ovrs_excg_cd'])
+    return holdings, summary
+
 def update_overseas_info():
-    token = get_token()
-    url = f"{URL_BASE}/uapi/overseas-stock/v1/trading/inquire-balance"
-    headers = {"Content-Type": "application/json", "authorization": f"Bearer {token}", "appKey": APP_KEY, "appSecret": APP_SECRET, "tr_id": "VTTT3012R"}
-    params = {"CANO": CANO, "ACNT_PRDT_CD": ACNT_PRDT_CD, "OVRS_EXCG_CD": "NASD", "TR_CRCY_CD": "USD", "WCRC_FRCR_DVSN_CD": "02", "CTX_AREA_FK200": "", "CTX_AREA_NK200": ""}
     try:
-        res = requests.get(url, headers=headers, params=params)
-        data = res.json()
-        if data.get("rt_cd") == "0":
-            summary = data.get("output2", {})
-            holdings = data.get("output1", [])
+        balance = get_balance_os(PRIO_DASHBOARD)
+        if balance:
+            holdings, summary = balance
             deposit = summary.get('frcr_dncl_amt_2') or summary.get('frcr_pchs_amt1') or "0.00"
-            real_evlu = calculate_real_evlu(holdings)
-            overseas_status["deposit"] = f"{float(deposit):,.2f}"
-            overseas_status["evlu_amt"] = f"{real_evlu:,.2f}"
-            overseas_status["total_asset"] = f"{(float(deposit) + real_evlu):,.2f}"
-    except: pass
-
-def trade_order_os(token, symbol, qty, price, is_buy=True):
-    url = f"{URL_BASE}/uapi/overseas-stock/v1/trading/order"
+            real_evlu = calculate_real_evlu(holdings.values())
+            return {"deposit": f"{float(deposit):,.2f}", "evlu_amt": f"{real_evlu:,.2f}", "total_asset": f"{(float(deposit) + real_evlu):,.2f}"}
+    except Exception:
+        ERRORS.inc(source="balance_os")
+    return None
+
+# 대시보드 폴링용 계좌 스냅샷 (여러 탭이 열려 있어도 TTL당 한 번만 조회)
+kr_snapshot = SnapshotCache(lambda: {"balance": get_balance_kr(PRIO_DASHBOARD)}, SNAPSHOT_TTL)
+os_snapshot = SnapshotCache(update_overseas_info, SNAPSHOT_TTL)
+
+def quote_key_os(symbol):
+    """실시간 시세 구독 키 (D + 시세 거래소 코드 + 종목)"""
+    return f"D{ExchangeResolver.PRICE_EXCD[exchanges_os.resolve(symbol)]}{symbol}"
+
+def quote_os(symbol):
+    """주문 단가용 현재가: 실시간 시세 -> REST 현재가 -> 최근 종가 순으로 사용"""
+    live = quotes.price(quote_feed.OS_TRADE, quote_key_os(symbol))
+    if live: return live
+    params = {"AUTH": "", "EXCD": ExchangeResolver.PRICE_EXCD[exchanges_os.resolve(symbol)], "SYMB": symbol}
+    try:
+        last = (kis.get("/uapi/overseas-price/v1/quotations/price", "HHDFS00000300", params, PRIO_ORDER).get("output") or {}).get("last")
+        if last and float(last) > 0: return float(last)
+    except (requests.RequestException, ValueError):
+        ERRORS.inc(source="quote_os")
+    return price_store.latest_close(symbol)
+
+def trade_order_os(symbol, qty, price, is_buy=True):
+    """접수되면 체결 추적용 주문 정보를 반환"""
     tr_id = "VTTT1002U" if is_buy else "VTTT1001U"
-    data = {"CANO": CANO, "ACNT_PRDT_CD": ACNT_PRDT_CD, "OVRS_EXCG_CD": "NASD", "PDNO": symbol, "ORD_QTY": str(int(qty)), "OVRS_ORD_UNPR": f"{float(price):.2f}", "ORD_SVR_DVSN_CD": "0", "ORD_DVSN": "00"}
-    headers = {"Content-Type": "application/json", "authorization": f"Bearer {token}", "appKey": APP_KEY, "appSecret": APP_SECRET, "tr_id": tr_id, "hashkey": hashkey(data)}
-    res = requests.post(url, headers=headers, data=json.dumps(data))
-    
+    exchange = exchanges_os.resolve(symbol)
+    data = {"CANO": CANO, "ACNT_PRDT_CD": ACNT_PRDT_CD, "OVRS_EXCG_CD": exchange, "PDNO": symbol, "ORD_QTY": str(int(qty)), "OVRS_ORD_UNPR": f"{float(price):.2f}", "ORD_SVR_DVSN_CD": "0", "ORD_DVSN": "00"}
+    res = kis.post("/uapi/overseas-stock/v1/trading/order", tr_id, data, with_hashkey=True)
+
+    os_snapshot.invalidate()
+    os_memo.invalidate()
     action = "매수" if is_buy else "매도"
-    if res.json().get("rt_cd") == "0":
-        log_msg(f"✅ [해외] {symbol} {qty}주 {action} 주문 성공", True)
-    else:
-        log_msg(f"❌ [해외] {action} 실패: {res.json().get('msg1')}", True)
+    if res.get("rt_cd") == "0":
+        log_msg(f"✅ [해외] {symbol} {qty}주 {action} 주문 성공", True, kind="order")
+        return {"odno": res.get("output", {}).get("ODNO", "").lstrip("0"), "code": symbol, "name": symbol, "exchange": exchange,
+                "qty": int(qty), "price": float(price), "is_buy": is_buy}
+    log_msg(f"❌ [해외] {action} 실패: {res.get('msg1')}", True, level="error", kind="order")
+    return None
 
-def overseas_trading_logic():
-    log_msg("🚀 해외주식 자동매매 쓰레드 가동", True)
-    while overseas_status["is_running"]:
-        if not is_market_open_os():
-            log_msg("💤 미국 시장이 닫혀 있습니다. (23:30~06:00 대기)", True)
-            time.sleep(600)
-            continue
+def _open_orders_exchange_os(exchange):
+    params = {"CANO": CANO, "ACNT_PRDT_CD": ACNT_PRDT_CD, "OVRS_EXCG_CD": exchange, "SORT_SQN": "DS", "CTX_AREA_FK200": "", "CTX_AREA_NK200": ""}
+    res = kis.get("/uapi/overseas-stock/v1/trading/inquire-nccs", "VTTT3018R", params, PRIO_ORDER)
+    if res.get("rt_cd") != "0": return None
+    return {o['odno'].lstrip("0"): int(float(o.get('nccs_qty') or 0)) for o in res.get('output', []) if float(o.get('nccs_qty') or 0) > 0}
+
+def open_orders_os():
+    """전 거래소 미체결 주문 {주문번호: 미체결 수량} (폐기/test.py 의 check_unfilled_orders 와 같은 조회를 동시에)"""
+    results = list(fetch_pool.map(_open_orders_exchange_os, EXCHANGES_OS))
+    if any(r is None for r in results): return None
+    return {odno: qty for part in results for odno, qty in part.items()}
+
+def revise_order_os(order, cancel=False):
+    """미체결 주문을 최근 가격으로 정정하거나 취소"""
+    price = 0.0 if cancel else quote_os(order["code"])
+    data = {"CANO": CANO, "ACNT_PRDT_CD": ACNT_PRDT_CD, "OVRS_EXCG_CD": order["exchange"], "PDNO": order["code"], "ORGN_ODNO": order["odno"],
+            "RVSE_CNCL_DVSN_CD": "02" if cancel else "01", "ORD_QTY": str(order["qty"]), "OVRS_ORD_UNPR": f"{price:.2f}", "ORD_SVR_DVSN_CD": "0"}
+    res = kis.post("/uapi/overseas-stock/v1/trading/order-rvsecncl", "VTTT1004U", data, with_hashkey=True)
+    if res.get("rt_cd") != "0" or cancel: return None
+    log_msg(f"✏️ 정정 주문: {order['name']} ${order['price']:.2f} -> ${price:.2f}", True, kind="order")
+    return dict(order, odno=res.get("output", {}).get("ODNO", "").lstrip("0"), price=price)
 
+def buying_power_os(symbol, price):
+    """매도 체결 후 실제 주문 가능 외화 금액 (해외주식 매수가능금액조회)"""
+    params = {"CANO": CANO, "ACNT_PRDT_CD": ACNT_PRDT_CD, "OVRS_EXCG_CD": exchanges_os.resolve(symbol), "OVRS_ORD_UNPR": f"{price:.2f}", "ITEM_CD": symbol}
+    res = kis.get("/uapi/overseas-stock/v1/trading/inquire-psamount", "VTTS3007R", params, PRIO_ORDER)
+    out = res.get("output", {}) if res.get("rt_cd") == "0" else {}
+    return float(out.get("ovrs_ord_psbl_amt") or out.get("ord_psbl_frcr_amt") or 0) if out else None
+
+os_signal = SignalCache(NYSE)
+os_memo = CycleMemo()
+os_tracker = OrderTracker(open_orders_os, revise_order_os, True, on_fill=os_memo.invalidate)
+
+def rebalance_os():
+    """해외 리밸런싱 1회: 모멘텀 분석 -> 교체 매도 -> 신규 매수"""
+    set_status(True, last_update=clock.local().strftime('%H:%M:%S'))
+
+    # 6개월 모멘텀 계산 (기본: TQQQ, EFA / 대피 GLD)
+    key, (targets, rets) = os_signal.get(UNIVERSE_OS, SAFE_ASSET_OS)
+    target_symbol = ", ".join(targets)
+
+    # 신호와 주문가능 외화가 지난번 '유지' 때와 같으면 잔고 조회 없이 끝냄 (단가는 로컬 저장소 값)
+    probe = next(iter(targets))
+    cash = buying_power_os(probe, float(price_store.closes(probe, 1).iloc[-1]))
+    if os_memo.unchanged(key, cash):
+        CYCLE_SKIPPED.inc(market="os")
+        return
+    set_status(True, target=target_symbol)
+    detail = ", ".join(f"{sym}:{r*100:.1f}%" for sym, r in rets.items())
+    log_msg(f"분석완료: {target_symbol} 선정 ({detail})", True, kind="signal")
+
+    # 잔고조회
+    balance = get_balance_os()
+    if balance:
+        holdings, summary = balance  # {종목: 보유내역}, 요약
+
+        sells = [h for sym, h in holdings.items() if sym not in targets and int(float(h['ovrs_cblc_qty'])) > 0]
+        to_buy = [sym for sym in targets if sym not in holdings]
+
+        # 매수 단가 조회를 매도 제출과 겹쳐서 진행
+        buy_prices = order_pool.submit(lambda: {sym: quote_os(sym) for sym in to_buy})
+
+        # 매도 (서로 독립이므로 동시에 제출)
+        for h in sells:
+            log_msg(f"♻️ 교체 매도: {h['ovrs_pdno']} {int(float(h['ovrs_cblc_qty']))}주", True, kind="order")
+        sold = list(order_pool.map(lambda h: trade_order_os(h['ovrs_pdno'], int(float(h['ovrs_cblc_qty'])), h.get('now_pric2'), False), sells))
+
+        # 매수 (매도가 있었다면 체결 확인 후 확보된 금액 기준)
+        deposit = float(summary.get('frcr_dncl_amt_2') or summary.get('frcr_pchs_amt1') or 0)
+        prices = buy_prices.result()
+        if prices and not sells_settled(os_tracker, sold, True):
+            return
+        if prices and any(sold):
+            sym, price = next(iter(prices.items()))
+            freed = buying_power_os(sym, price)
+            if freed is not None: deposit = freed
+        budget = deposit
+        buys = []
+        for sym, price in prices.items():
+            qty = int(min(budget, deposit * targets[sym]) / price)
+            if qty > 0:
+                log_msg(f"🛒 신규 매수: {sym} {qty}주 시도 (예수금: ${budget})", True, kind="order")
+                buys.append((sym, qty, price))
+                budget -= qty * price
+            else:
+                log_msg(f"⚠️ 매수 불가: 예수금(${budget}) 부족", True, level="warn", kind="order")
+        bought = list(order_pool.map(lambda b: trade_order_os(*b, True), buys))
+        if any(bought):
+            os_tracker.wait_filled(bought)
+        if not sells and not to_buy:
+            os_memo.settle(key, cash)
+        if not to_buy:
+            log_msg(f"✅ 유지: {target_symbol} 이미 보유 중", True, level="debug")
+
+async def overseas_trading_logic(stop):
+    log_msg("🚀 해외주식 자동매매 쓰레드 가동", True)
+    if QUOTE_FEED and quotes.available:
+        symbols = list(UNIVERSE_OS) + [SAFE_ASSET_OS]
         try:
-            token = get_token()
-            overseas_status["last_update"] = datetime.datetime.now().strftime('%H:%M:%S')
-            
-            # 6개월 모멘텀 계산 (TQQQ, EFA, GLD)
-            df_t = yf.Ticker("TQQQ").history(period="7mo")
-            df_e = yf.Ticker("EFA").history(period="7mo")
-            ret_t = (df_t['Close'].iloc[-1] / df_t['Close'].iloc[-126]) - 1
-            ret_e = (df_e['Close'].iloc[-1] / df_e['Close'].iloc[-126]) - 1
-            
-            target_symbol = ("TQQQ" if ret_t > ret_e else "EFA") if max(ret_t, ret_e) > 0 else "GLD"
-            overseas_status["target"] = target_symbol
-            log_msg(f"분석완료: {target_symbol} 선정 (TQQQ:{ret_t*100:.1f}%, EFA:{ret_e*100:.1f}%)", True)
-
-            # 잔고조회
-            url_bal = f"{URL_BASE}/uapi/overseas-stock/v1/trading/inquire-balance"
-            params_bal = {"CANO": CANO, "ACNT_PRDT_CD": ACNT_PRDT_CD, "OVRS_EXCG_CD": "NASD", "TR_CRCY_CD": "USD", "WCRC_FRCR_DVSN_CD": "02", "CTX_AREA_FK200": "", "CTX_AREA_NK200": ""}
-            res_bal = requests.get(url_bal, headers={"Content-Type": "application/json", "authorization": f"Bearer {token}", "appKey": APP_KEY, "appSecret": APP_SECRET, "tr_id": "VTTT3012R"}, params=params_bal).json()
-            
-            if res_bal.get('rt_cd') == '0':
-                holdings = res_bal.get("output1", [])
-                summary = res_bal.get("output2", {})
-                
-                # 매도
-                for item in holdings:
-                    sym = item.get('ovrs_pdno')
-                    qty = int(float(item.get('ovrs_cblc_qty', 0)))
-                    if sym != target_symbol and qty > 0:
-                        log_msg(f"♻️ 교체 매도: {sym} {qty}주", True)
-                        trade_order_os(token, sym, qty, item.get('now_pric2'), False)
-                        time.sleep(2)
-
-                # 매수
-                is_holding = any(h.get('ovrs_pdno') == target_symbol for h in holdings)
-                if not is_holding:
-                    deposit = float(summary.get('frcr_dncl_amt_2') or summary.get('frcr_pchs_amt1') or 0)
-                    price = float(yf.Ticker(target_symbol).history(period="1d")['Close'].iloc[-1])
-                    qty = int(deposit / price)
-                    if qty > 0:
-                        log_msg(f"🛒 신규 매수: {target_symbol} {qty}주 시도 (예수금: ${deposit})", True)
-                        trade_order_os(token, target_symbol, qty, price, True)
-                    else:
-                        log_msg(f"⚠️ 매수 불가: 예수금(${deposit}) 부족", True)
-                else:
-                    log_msg(f"✅ 유지: {target_symbol} 이미 보유 중", True)
+            keys = await engine.blocking(lambda: [quote_key_os(sym) for sym in symbols])  # 처음 보는 종목은 거래소 조회가 필요
+            await start_quote_feed([(quote_feed.OS_TRADE, key) for key in keys])
+        except Exception as e:  # 거래소 조회/토큰 실패로 매매 루프까지 죽지 않게: 실시간 시세 없이 REST 로 조회
+            ERRORS.inc(source="quote_feed")
+            log_msg(f"⚠️ 실시간 시세 구독 실패, REST 시세로 진행: {e}", True, level="error", kind="error")
+    await resume_orders("os", os_tracker)
+    await run_scheduled(SCHEDULE_OS, rebalance_os, stop, True)
+
+async def refresh_snapshots():
+    """대시보드가 보고 있는 계좌 스냅샷을 엔진에서 갱신 (Flask 요청 스레드는 KIS 를 부르지 않음)"""
+    while True:
+        stale = [c for c in (kr_snapshot, os_snapshot) if c.wanted()]
+        if stale:
+            await asyncio.gather(*(engine.blocking(c.refresh) for c in stale), return_exceptions=True)
+        await asyncio.sleep(0.5)
+
+if not ENGINE_ADDRESS:
+    engine.spawn("snapshots", refresh_snapshots())  # 엔진을 따로 띄우면 엔진 프로세스(serve_engine)에서만 돌림
+
+workers = {"kr": MarketWorker("kr", trading_logic_kr, bot_status), "os": MarketWorker("os", overseas_trading_logic, overseas_status)}
+STATUS = {"kr": (bot_status, kr_snapshot), "os": (overseas_status, os_snapshot)}
+
+# --- [6. 엔진 API] 라우트는 아래 함수만 control 을 거쳐 부른다 (엔진 프로세스가 따로면 IPC 로 전달) ---
+
+def _merge_deltas(deltas):
+    """여러 delta를 하나로 합침 (로그는 최신순으로 이어 붙이고 나머지 값은 마지막 값 사용)"""
+    merged, logs = {}, []
+    for d in deltas:
+        if "log" in d: logs = d["log"] + logs
+        merged.update({k: v for k, v in d.items() if k != "log"})
+    if logs: merged["log"] = logs
+    return merged
+
+def status_view(market):
+    """대시보드 폴링용 전체 상태 (상태 + 계좌 스냅샷 + 최근 로그)"""
+    status, cache = STATUS[market]
+    snap, age = cache.peek()
+    return dict(status.snapshot(), **snap, log=log_lines(market), snapshot_age=age)
+
+def stream_view(market, cursor, timeout):
+    """cursor 이후 변경분을 timeout 초까지 기다림 -> (버전, delta, 계좌 스냅샷). 저널을 벗어난 커서면 전체 상태"""
+    status, cache = STATUS[market]
+    version, deltas = FEEDS[market].since(cursor, timeout)
+    delta = dict(status.snapshot(), log=log_lines(market), full=True) if deltas is None else _merge_deltas(deltas)
+    snap, _ = cache.peek()
+    return version, delta, snap
+
+RESUME = {"kr": (KRX, kr_signal, kr_tracker), "os": (NYSE, os_signal, os_tracker)}  # 시장 -> (달력, 신호 메모, 체결 추적기)
+
+def engine_state():
+    """체크포인트 내용: 시장별 화면 상태(실행 여부 포함), 마지막 신호, 체결 대기 주문, 이벤트 커서"""
+    return {"event_seq": events.seq,
+            "markets": {m: {"status": dict(STATUS[m][0].snapshot()), "signal": signal.dump(), "pending": tracker.pending_orders()}
+                        for m, (_, signal, tracker) in RESUME.items()}}
+
+checkpoint = Checkpoint(CHECKPOINT_PATH, engine_state, CHECKPOINT_INTERVAL)
+
+def restore_engine(state):
+    """체크포인트에서 복원: 화면 상태와 신호 메모를 되살리고, 돌던 시장은 다시 시작한다.
+    체결 대기 주문은 같은 거래일에 저장된 것만 이어서 추적한다 (지난 주문은 이미 만료)"""
+    events.seq = max(events.seq, state.get("event_seq", 0))  # 이벤트 커서가 뒤로 가지 않게
+    saved_at = datetime.datetime.fromisoformat(state["saved_at"]) if state.get("saved_at") else None
+    for market, saved in state.get("markets", {}).items():
+        if market not in RESUME: continue
+        calendar, signal, _ = RESUME[market]
+        status = dict(saved.get("status", {}))
+        running = status.pop("is_running", False)
+        STATUS[market][0].update(**status)
+        if saved.get("signal"): signal.restore(saved["signal"])
+        if saved.get("pending") and saved_at and saved_at.astimezone(calendar.tz).date() == now_kst().astimezone(calendar.tz).date():
+            resume_pending[market] = saved["pending"]
+        if running and workers[market].start():
+            log_msg(f"♻️ 체크포인트({state.get('saved_at')})에서 이어서 실행", market == "os")
 
-            time.sleep(3600)
-        except Exception as e: log_msg(f"⚠️ 해외 에러: {e}", True); time.sleep(60)
+def boot(resume=True):
+    """엔진 시작: 체크포인트가 있으면 이어서 돌리고, 주기 저장 태스크와 데이터 스택 미리 읽기를 엔진에 띄운다"""
+    state = checkpoint.load() if resume else None
+    if state: restore_engine(state)
+    engine.spawn("checkpoint", checkpoint.run())
+    engine.spawn("prewarm", engine.blocking(importlib.import_module, "yfinance"))  # 첫 사이클이 import 를 기다리지 않게
 
-# --- [6. Flask 라우트] ---
+def start_market(market):
+    started = workers[market].start()
+    checkpoint.save()  # 시작/정지는 바로 남겨 재시작 시 운영자 의도대로 복원
+    return started
+
+def stop_market(market):
+    workers[market].stop()
+    checkpoint.save()
+
+ENGINE_API = {
+    "status": status_view,
+    "stream": stream_view,
+    "events": lambda cursor, market, limit: events.after(cursor, market, limit),
+    "metrics": lambda: METRICS.render(),
+    "health": lambda: {m: status.snapshot()["is_running"] for m, (status, _) in STATUS.items()},
+    "start": start_market,
+    "stop": stop_market,
+}
+control = engine_ipc.EngineClient(ENGINE_ADDRESS, ENGINE_AUTHKEY) if ENGINE_ADDRESS else engine_ipc.LocalEngine(ENGINE_API)
+
+def serve_engine(resume=True):
+    """매매 엔진 전용 프로세스: 매매 루프와 계좌 조회를 돌리고, 웹 프로세스의 조회/명령을 ENGINE_ADDRESS 로 받는다"""
+    global control
+    control = engine_ipc.LocalEngine(ENGINE_API)
+    engine.spawn("snapshots", refresh_snapshots())
+    boot(resume)
+    server = engine_ipc.EngineServer(ENGINE_ADDRESS, ENGINE_AUTHKEY, ENGINE_API)
+    log_msg(f"🛠 매매 엔진 시작 ({ENGINE_ADDRESS} 에서 웹 요청 대기)", level="debug")
+    server.serve_forever()
+
+# --- [7. Flask 라우트] ---
 
 @app.route('/')
 def index(): return render_template('index.html')
@@ -279,36 +1432,74 @@ def index(): return render_template('index.html')
 @app.route('/overseas')
 def overseas_page(): return render_template('overseas.html')
 
+@app.errorhandler(engine_ipc.EngineUnavailable)
+def engine_unavailable(e):
+    return jsonify(status="fail", error=str(e)), 503
+
+@app.route('/health')
+def health():
+    """헬스체크: 웹이 떠 있고 엔진이 응답하면 200 (시장별 실행 여부 포함)"""
+    return jsonify(status="ok", running=control.call("health"))
+
 @app.route('/status')
-def get_status(): 
-    get_balance_kr() 
-    return jsonify(bot_status)
+def get_status(): return jsonify(control.call("status", "kr"))
 
 @app.route('/overseas_status')
-def get_o_status():
-    update_overseas_info() 
-    return jsonify(overseas_status)
+def get_o_status(): return jsonify(control.call("status", "os"))
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus 수집용 지표 (text format 0.0.4)"""
+    return Response(control.call("metrics"), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/events')
+def get_events():
+    """구조화 이벤트 조회: /events?after=<seq>&market=kr|os&limit=200"""
+    cursor = request.args.get('after', default=0, type=int)
+    limit = min(request.args.get('limit', default=200, type=int), 1000)
+    items = control.call("events", cursor, request.args.get('market'), limit)
+    return jsonify(events=items, cursor=items[-1]["seq"] if items else max(cursor, 0))
+
+@app.route('/stream/<market>')
+def stream_status(market):
+    """SSE 상태 스트림: 최초 1회 전체 상태, 이후에는 로그/목표/잔고 변경분만 전송"""
+    if market not in STATUS: return jsonify(status="fail"), 404
+    cursor = int(request.headers.get('Last-Event-ID') or request.args.get('cursor') or -1)
+
+    def generate(cursor):
+        sent_snap = None
+        while True:
+            try:
+                version, delta, snap = control.call("stream", market, cursor, SNAPSHOT_TTL)
+            except engine_ipc.EngineUnavailable:
+                return  # 엔진 재시작 중: 브라우저 EventSource 가 Last-Event-ID 로 다시 붙음
+            if snap != sent_snap:
+                delta.update(snap)
+                sent_snap = snap
+            cursor = version
+            yield f"id: {version}\ndata: {json.dumps(delta, ensure_ascii=False)}\n\n" if delta else ": keepalive\n\n"
+
+    return Response(generate(cursor), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/start', methods=['POST'])
-def start_kr():
-    if not bot_status["is_running"]:
-        bot_status["is_running"] = True
-        threading.Thread(target=trading_logic_kr, daemon=True).start()
-        return jsonify(status="ok")
-    return jsonify(status="fail")
+def start_kr(): return jsonify(status="ok" if control.call("start", "kr") else "fail")
 
 @app.route('/overseas_start', methods=['POST'])
-def start_os():
-    if not overseas_status["is_running"]:
-        overseas_status["is_running"] = True
-        threading.Thread(target=overseas_trading_logic, daemon=True).start()
-        return jsonify(status="ok")
-    return jsonify(status="fail")
+def start_os(): return jsonify(status="ok" if control.call("start", "os") else "fail")
 
 @app.route('/stop', methods=['POST'])
-def stop_kr(): bot_status["is_running"] = False; return jsonify(status="ok")
+def stop_kr(): control.call("stop", "kr"); return jsonify(status="ok")
 @app.route('/overseas_stop', methods=['POST'])
-def stop_os(): overseas_status["is_running"] = False; return jsonify(status="ok")
+def stop_os(): control.call("stop", "os"); return jsonify(status="ok")
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="KIS 자동매매 대시보드 / 매매 엔진")
+    parser.add_argument("--engine", action="store_true", help="웹 없이 매매 엔진만 실행 (config 의 ENGINE_ADDRESS 로 웹 요청을 받음)")
+    parser.add_argument("--no-resume", action="store_true", help="체크포인트를 무시하고 정지 상태로 시작")
+    args = parser.parse_args()
+    if args.engine:
+        if not ENGINE_ADDRESS: parser.error("--engine 은 config.yaml 에 ENGINE_ADDRESS 가 있어야 합니다")
+        serve_engine(not args.no_resume)
+    else:
+        if not ENGINE_ADDRESS: boot(not args.no_resume)  # 엔진을 따로 띄웠으면 이 프로세스는 웹만
+        app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
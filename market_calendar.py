@@ -0,0 +1,168 @@
+"""KRX / NYSE 거래일·장 시간 계산 (시간대, 서머타임, 휴장일 반영)
+
+휴장일은 규칙으로 계산할 수 있는 날(양력 공휴일, 미국 휴장 규칙)은 직접 계산하고,
+설/추석 같은 음력 휴일은 holidays 패키지가 있으면 사용, 없으면 config.yaml 의 목록으로 보충한다.
+"""
+import datetime
+from zoneinfo import ZoneInfo
+
+try:
+    import holidays as _holidays  # 선택 의존성
+except ImportError:
+    _holidays = None
+
+KST = ZoneInfo("Asia/Seoul")
+NEW_YORK = ZoneInfo("America/New_York")
+
+
+def _nth_weekday(year, month, weekday, n):
+    """n번째 요일 (n=-1 이면 마지막)"""
+    if n > 0:
+        first = datetime.date(year, month, 1)
+        return first + datetime.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = datetime.date(year + (month == 12), month % 12 + 1, 1) - datetime.timedelta(days=1)
+    return last - datetime.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year):
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    month = (h + l - 7 * m + 90) // 25
+    return datetime.date(year, month, (h + l - 7 * m + 33 * month + 19) % 32)
+
+
+def _observed(day):
+    """토요일 휴일은 금요일, 일요일 휴일은 월요일에 쉼"""
+    if day.weekday() == 5: return day - datetime.timedelta(days=1)
+    if day.weekday() == 6: return day + datetime.timedelta(days=1)
+    return day
+
+
+def nyse_holidays(year):
+    days = {
+        _nth_weekday(year, 1, 0, 3),   # 마틴 루서 킹 데이
+        _nth_weekday(year, 2, 0, 3),   # 대통령의 날
+        _easter(year) - datetime.timedelta(days=2),  # 성금요일
+        _nth_weekday(year, 5, 0, -1),  # 메모리얼 데이
+        _observed(datetime.date(year, 7, 4)),
+        _nth_weekday(year, 9, 0, 1),   # 노동절
+        _nth_weekday(year, 11, 3, 4),  # 추수감사절
+        _observed(datetime.date(year, 12, 25)),
+    }
+    new_year = datetime.date(year, 1, 1)
+    if new_year.weekday() != 5: days.add(_observed(new_year))  # 토요일이면 전년도 12/31 에 쉬지 않음
+    if year >= 2022: days.add(_observed(datetime.date(year, 6, 19)))  # 준틴스
+    if _holidays:
+        days.update(d for d in _holidays.financial_holidays("NYSE", years=year))
+    return days
+
+
+def nyse_early_closes(year):
+    """13:00 조기 폐장일"""
+    days = {_nth_weekday(year, 11, 3, 4) + datetime.timedelta(days=1)}
+    for day in (datetime.date(year, 7, 3), datetime.date(year, 12, 24)):
+        if day.weekday() < 5: days.add(day)
+    return days - nyse_holidays(year)
+
+
+def krx_holidays(year, extra=()):
+    days = {datetime.date(year, m, d) for m, d in ((1, 1), (3, 1), (5, 1), (5, 5), (6, 6), (8, 15), (10, 3), (10, 9), (12, 25))}
+    year_end = datetime.date(year, 12, 31)
+    while year_end.weekday() >= 5: year_end -= datetime.timedelta(days=1)
+    days.add(year_end)  # 연말 휴장일
+    if _holidays:
+        days.update(_holidays.KR(years=year))
+    days.update(d for d in extra if d.year == year)
+    return days
+
+
+class MarketCalendar:
+    """거래소 현지 시간 기준 세션 계산"""
+    def __init__(self, tz, open_time, close_time, holidays_fn, early_close_fn=None, early_close_time=None):
+        self.tz = tz
+        self.open_time = open_time
+        self.close_time = close_time
+        self.holidays_fn = holidays_fn
+        self.early_close_fn = early_close_fn
+        self.early_close_time = early_close_time
+        self._cache = {}
+
+    def _holidays(self, year):
+        if year not in self._cache:
+            early = self.early_close_fn(year) if self.early_close_fn else set()
+            self._cache[year] = (self.holidays_fn(year), early)
+        return self._cache[year]
+
+    def is_trading_day(self, day):
+        return day.weekday() < 5 and day not in self._holidays(day.year)[0]
+
+    def session(self, day):
+        """해당 날짜의 (개장, 폐장) 시각 (시간대 포함)"""
+        close = self.early_close_time if day in self._holidays(day.year)[1] else self.close_time
+        return (datetime.datetime.combine(day, self.open_time, self.tz), datetime.datetime.combine(day, close, self.tz))
+
+    def is_open(self, now):
+        local = now.astimezone(self.tz)
+        if not self.is_trading_day(local.date()): return False
+        start, end = self.session(local.date())
+        return start <= local <= end
+
+    def sessions_from(self, now):
+        """now 가 속한(또는 이후의) 세션들을 차례로 반환"""
+        day = now.astimezone(self.tz).date()
+        while True:
+            if self.is_trading_day(day):
+                start, end = self.session(day)
+                if end > now: yield start, end
+            day += datetime.timedelta(days=1)
+
+    def last_session_date(self, now):
+        """now 시점에 일봉이 확정된 가장 최근 거래일"""
+        day = now.astimezone(self.tz).date()
+        while True:
+            if self.is_trading_day(day) and self.session(day)[1] <= now: return day
+            day -= datetime.timedelta(days=1)
+
+
+class MarketScheduler:
+    """세션 안에서 '개장 + open_offset' 부터 interval 간격으로, '폐장 - close_offset' 까지 실행 시각을 만든다."""
+    def __init__(self, calendar, open_offset_min=5, interval_min=60, close_offset_min=10):
+        self.calendar = calendar
+        self.open_offset = datetime.timedelta(minutes=open_offset_min)
+        self.interval = datetime.timedelta(minutes=interval_min)
+        self.close_offset = datetime.timedelta(minutes=close_offset_min)
+
+    def in_window(self, now):
+        """지금 바로 매매해도 되는 구간인지 (개장 + offset ~ 폐장 - offset)"""
+        for start, end in self.calendar.sessions_from(now):
+            return start + self.open_offset <= now <= end - self.close_offset
+        return False
+
+    def next_run(self, after):
+        """after 보다 늦은 첫 실행 시각"""
+        for start, end in self.calendar.sessions_from(after):
+            run_at = start + self.open_offset
+            while run_at <= end - self.close_offset:
+                if run_at > after: return run_at
+                run_at += self.interval
+
+
+def krx_calendar(extra_holidays=()):
+    extra = [datetime.date.fromisoformat(str(d)) for d in extra_holidays]
+    return MarketCalendar(KST, datetime.time(9, 0), datetime.time(15, 30), lambda y: krx_holidays(y, extra))
+
+
+def krx_missing_years(extra_holidays, years):
+    """음력 휴일(설/추석 등)을 알 수 없는 연도: holidays 패키지가 없고 extra_holidays 에도 그 해 날짜가 없는 해"""
+    if _holidays: return []
+    covered = {datetime.date.fromisoformat(str(d)).year for d in extra_holidays}
+    return [y for y in years if y not in covered]
+
+
+def nyse_calendar():
+    return MarketCalendar(NEW_YORK, datetime.time(9, 30), datetime.time(16, 0), nyse_holidays, nyse_early_closes, datetime.time(13, 0))
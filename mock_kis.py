@@ -0,0 +1,385 @@
+"""로컬 KIS 모의 서버와 고정 일봉 시세 (성능 측정/회귀 확인용).
+
+final_app 이 쓰는 엔드포인트(tokenP, Approval, hashkey, 국내 시세/주문가능/잔고/주문/미체결/정정,
+해외 시세/잔고/주문/미체결/정정/매수가능)만 흉내 낸다. QuoteStandIn 은 실시간 시세 WebSocket 을 흉내 낸다.
+지연, 오류율, 초당 한도(EGW00201)는 설정으로 바꿀 수 있고, 같은 seed 면 항상 같은 결과가 나온다.
+
+사용 예:
+    prices = FixturePrices(seed=1)
+    broker = MockBroker(prices, latency=0.02, rps=20)
+    server, url = serve(broker)   # url 을 KisClient 의 url_base 로 사용
+"""
+import asyncio
+import datetime
+import json
+import random
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+from flask import Flask, jsonify, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import market_calendar
+import quote_feed
+from quote_feed import websockets  # 선택 의존성 (QuoteStandIn 에만 필요)
+
+
+class FixturePrices:
+    """종목별로 고정된 일봉 종가 (seed + 종목명으로 만든 랜덤워크).
+    PriceStore(source=...) 로 yfinance 대신 쓰고, 모의 서버 현재가도 같은 마지막 종가를 쓴다."""
+    def __init__(self, seed=0, days=400, end=None, drift=None):
+        self.seed = seed
+        self.days = days
+        self.end = pd.Timestamp(end or datetime.date.today())
+        self.drift = drift or {}  # 종목별 일간 평균 수익률 (모멘텀 순위를 고정하고 싶을 때)
+        self._cache = {}
+
+    def series(self, ticker):
+        if ticker not in self._cache:
+            rng = np.random.default_rng([self.seed, *ticker.encode()])
+            rets = rng.normal(self.drift.get(ticker, 0.0003), 0.012, self.days)
+            start = 20000.0 if ticker.endswith(".KS") else 100.0
+            closes = np.round(start * np.cumprod(1 + rets), 2)
+            self._cache[ticker] = pd.Series(closes, index=pd.bdate_range(end=self.end, periods=self.days), name=ticker)
+        return self._cache[ticker]
+
+    def __call__(self, ticker, start=None):
+        s = self.series(ticker)
+        return s[s.index >= pd.Timestamp(start)] if start else s.iloc[-252:]
+
+    def last(self, ticker):
+        return float(self.series(ticker).iloc[-1])
+
+
+class MockBroker:
+    """모의 계좌 상태와 서버 동작 설정.
+    fill_polls: 주문 후 미체결 조회를 몇 번 받아야 체결되는지 (0 이면 접수 즉시 체결)
+    page_size: 잔고 조회 한 페이지당 종목 수 (연속조회 경로를 태우려면 작게)"""
+    def __init__(self, prices, latency=0.0, jitter=0.0, error_rate=0.0, rps=0, fill_polls=0, page_size=50, seed=0,
+                 cash_kr=10_000_000, cash_os=10_000.0, holdings_kr=None, holdings_os=None, exchanges=None):
+        self.prices = prices
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rps = rps
+        self.fill_polls = fill_polls
+        self.page_size = page_size
+        self.exchanges = exchanges or {}  # 해외 종목 -> 거래소 (모르면 NASD)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = (0, 0)  # (초, 그 초의 요청 수)
+        self._odno = 0
+        self.requests = {}  # tr_id(또는 경로)별 요청 수
+        self.reset(cash_kr, cash_os, holdings_kr, holdings_os)
+
+    def reset(self, cash_kr=10_000_000, cash_os=10_000.0, holdings_kr=None, holdings_os=None):
+        with self._lock:
+            self.cash = {"kr": cash_kr, "os": cash_os}
+            self.holdings = {"kr": dict(holdings_kr or {}), "os": dict(holdings_os or {})}
+            self.orders = {}  # 주문번호 -> 미체결 주문
+
+    def quote(self, symbol, market):
+        return self.prices.last(f"{symbol}.KS" if market == "kr" else symbol)
+
+    # --- 서버 동작 ---
+
+    def before_request(self, label):
+        """지연/한도/오류 주입. 응답을 가로채야 하면 (본문, 상태코드) 반환"""
+        with self._lock:
+            self.requests[label] = self.requests.get(label, 0) + 1
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0)
+            fail = self.error_rate and self._rng.random() < self.error_rate
+            limited = False
+            if self.rps:
+                sec = int(time.monotonic())
+                count = self._window[1] + 1 if self._window[0] == sec else 1
+                self._window = (sec, count)
+                limited = count > self.rps
+        if delay: time.sleep(delay)
+        if limited:
+            return {"rt_cd": "1", "msg_cd": "EGW00201", "msg1": "초당 거래건수를 초과하였습니다."}, 500
+        if fail:
+            return {"rt_cd": "1", "msg_cd": "MOCK0001", "msg1": "모의 서버 오류"}, 200
+        return None
+
+    def _next_odno(self):
+        self._odno += 1
+        return f"{self._odno:010d}"
+
+    def _fill(self, order):
+        market, sym, qty = order["market"], order["symbol"], order["qty"]
+        if order["is_buy"]:
+            self.holdings[market][sym] = self.holdings[market].get(sym, 0) + qty
+        else:
+            self.holdings[market][sym] = self.holdings[market].get(sym, 0) - qty
+            if self.holdings[market][sym] <= 0: del self.holdings[market][sym]
+            self.cash[market] += qty * order["price"]
+
+    def place(self, market, symbol, qty, price, is_buy):
+        with self._lock:
+            if is_buy and qty * price > self.cash[market]:
+                return None, "주문가능금액을 초과 했습니다"
+            if not is_buy and self.holdings[market].get(symbol, 0) < qty:
+                return None, "주문가능수량을 초과 했습니다"
+            if is_buy: self.cash[market] -= qty * price
+            order = {"odno": self._next_odno(), "market": market, "symbol": symbol, "qty": qty, "price": price, "is_buy": is_buy, "polls": self.fill_polls}
+            if order["polls"] > 0: self.orders[order["odno"]] = order
+            else: self._fill(order)
+            return order["odno"], None
+
+    def open_orders(self, market):
+        """미체결 조회 한 번 = 체결까지 남은 횟수 한 번 차감"""
+        with self._lock:
+            for odno, order in list(self.orders.items()):
+                if order["market"] != market: continue
+                order["polls"] -= 1
+                if order["polls"] <= 0:
+                    self._fill(self.orders.pop(odno))
+            return [o for o in self.orders.values() if o["market"] == market]
+
+    def revise(self, odno, cancel, price):
+        with self._lock:
+            order = self.orders.pop(odno.lstrip("0").zfill(10), None)
+            if not order: return None
+            if order["is_buy"]: self.cash[order["market"]] += order["qty"] * order["price"]
+            if cancel: return order["odno"]
+            order = dict(order, odno=self._next_odno(), price=price or order["price"])
+            if order["is_buy"]: self.cash[order["market"]] -= order["qty"] * order["price"]
+            self.orders[order["odno"]] = order
+            return order["odno"]
+
+
+def _ok(**fields):
+    return jsonify(rt_cd="0", msg_cd="MCA00000", msg1="정상처리 되었습니다.", **fields)
+
+
+def _page(items, size, cursor_key):
+    """연속조회 흉내: 커서(시작 위치)부터 size개, 남았으면 tr_cont=M"""
+    start = int(request.args.get(cursor_key) or 0) if request.headers.get("tr_cont") == "N" else 0
+    chunk, more = items[start:start + size], start + size < len(items)
+    return chunk, (str(start + size) if more else ""), ("M" if more else "D")
+
+
+def create_app(broker):
+    app = Flask("mock_kis")
+
+    @app.before_request
+    def inject():
+        label = request.headers.get("tr_id") or request.path.rsplit("/", 1)[-1]
+        injected = broker.before_request(label)
+        if injected:
+            body, code = injected
+            return jsonify(body), code
+
+    @app.post("/oauth2/tokenP")
+    def token():
+        expires = datetime.datetime.now(market_calendar.KST) + datetime.timedelta(days=1)  # 실서버처럼 KST 벽시계 시각
+        return jsonify(access_token="mock-token", token_type="Bearer", expires_in=86400,
+                       access_token_token_expired=expires.strftime('%Y-%m-%d %H:%M:%S'))
+
+    @app.post("/oauth2/Approval")
+    def approval():
+        return jsonify(approval_key="mock-approval-key")
+
+    @app.post("/uapi/hashkey")
+    def hashkey():
+        return jsonify(HASH=f"mock{zlib.crc32(request.get_data()):010d}")
+
+    # --- 국내 ---
+
+    @app.get("/uapi/domestic-stock/v1/quotations/inquire-price")
+    def inquire_price():
+        return _ok(output={"stck_prpr": str(int(broker.quote(request.args["FID_INPUT_ISCD"], "kr")))})
+
+    @app.get("/uapi/domestic-stock/v1/trading/inquire-psbl-order")
+    def inquire_psbl_order():
+        return _ok(output={"ord_psbl_cash": str(int(broker.cash["kr"]))})
+
+    @app.get("/uapi/domestic-stock/v1/trading/inquire-balance")
+    def inquire_balance_kr():
+        items = [{"pdno": c, "prdt_name": c, "hldg_qty": str(q), "prpr": str(int(broker.quote(c, "kr")))} for c, q in sorted(broker.holdings["kr"].items())]
+        chunk, cursor, cont = _page(items, broker.page_size, "CTX_AREA_NK100")
+        resp = _ok(output1=chunk, output2=[{"dnca_tot_amt": str(int(broker.cash["kr"]))}], ctx_area_fk100="", ctx_area_nk100=cursor)
+        resp.headers["tr_cont"] = cont
+        return resp
+
+    @app.post("/uapi/domestic-stock/v1/trading/order-cash")
+    def order_cash():
+        body = request.get_json(force=True)
+        is_buy = request.headers.get("tr_id") in ("VTTC0802U", "TTTC0802U")
+        odno, err = broker.place("kr", body["PDNO"], int(body["ORD_QTY"]), int(body["ORD_UNPR"]), is_buy)
+        if err: return jsonify(rt_cd="1", msg_cd="APBK0952", msg1=err)
+        return _ok(output={"KRX_FWDG_ORD_ORGNO": "00950", "ODNO": odno, "ORD_TMD": time.strftime("%H%M%S")})
+
+    @app.get("/uapi/domestic-stock/v1/trading/inquire-daily-ccld")
+    def inquire_daily_ccld():
+        return _ok(output1=[{"odno": o["odno"], "pdno": o["symbol"], "ord_qty": str(o["qty"]), "rmn_qty": str(o["qty"])} for o in broker.open_orders("kr")])
+
+    @app.post("/uapi/domestic-stock/v1/trading/order-rvsecncl")
+    def order_rvsecncl_kr():
+        body = request.get_json(force=True)
+        odno = broker.revise(body["ORGN_ODNO"], body["RVSE_CNCL_DVSN_CD"] == "02", int(body["ORD_UNPR"]))
+        if not odno: return jsonify(rt_cd="1", msg_cd="APBK0918", msg1="정정/취소할 수량이 없습니다")
+        return _ok(output={"KRX_FWDG_ORD_ORGNO": "00950", "ODNO": odno})
+
+    # --- 해외 ---
+
+    @app.get("/uapi/overseas-price/v1/quotations/price")
+    def overseas_price():
+        symbol, excd = request.args["SYMB"], request.args["EXCD"]
+        listed = {"NASD": "NAS", "NYSE": "NYS", "AMEX": "AMS"}[broker.exchanges.get(symbol, "NASD")]
+        return _ok(output={"rsym": f"D{excd}{symbol}", "last": f"{broker.quote(symbol, 'os'):.2f}" if excd == listed else ""})
+
+    @app.get("/uapi/overseas-stock/v1/trading/inquire-balance")
+    def inquire_balance_os():
+        exchange = request.args["OVRS_EXCG_CD"]
+        items = [{"ovrs_pdno": s, "ovrs_item_name": s, "ovrs_cblc_qty": str(q), "now_pric2": f"{broker.quote(s, 'os'):.2f}", "ovrs_excg_cd": exchange}
+                 for s, q in sorted(broker.holdings["os"].items()) if broker.exchanges.get(s, "NASD") == exchange]
+        chunk, cursor, cont = _page(items, broker.page_size, "CTX_AREA_NK200")
+        resp = _ok(output1=chunk, output2={"frcr_dncl_amt_2": f"{broker.cash['os']:.2f}", "frcr_pchs_amt1": "0.00"}, ctx_area_fk200="", ctx_area_nk200=cursor)
+        resp.headers["tr_cont"] = cont
+        return resp
+
+    @app.post("/uapi/overseas-stock/v1/trading/order")
+    def order_os():
+        body = request.get_json(force=True)
+        is_buy = request.headers.get("tr_id") in ("VTTT1002U", "TTTT1002U")
+        odno, err = broker.place("os", body["PDNO"], int(body["ORD_QTY"]), float(body["OVRS_ORD_UNPR"]), is_buy)
+        if err: return jsonify(rt_cd="1", msg_cd="APBK0952", msg1=err)
+        return _ok(output={"KRX_FWDG_ORD_ORGNO": "01790", "ODNO": odno, "ORD_TMD": time.strftime("%H%M%S")})
+
+    @app.get("/uapi/overseas-stock/v1/trading/inquire-nccs")
+    def inquire_nccs():
+        exchange = request.args["OVRS_EXCG_CD"]
+        return _ok(output=[{"odno": o["odno"], "pdno": o["symbol"], "nccs_qty": str(o["qty"])} for o in broker.open_orders("os")
+                           if broker.exchanges.get(o["symbol"], "NASD") == exchange])
+
+    @app.post("/uapi/overseas-stock/v1/trading/order-rvsecncl")
+    def order_rvsecncl_os():
+        body = request.get_json(force=True)
+        odno = broker.revise(body["ORGN_ODNO"], body["RVSE_CNCL_DVSN_CD"] == "02", float(body["OVRS_ORD_UNPR"]))
+        if not odno: return jsonify(rt_cd="1", msg_cd="APBK0918", msg1="정정/취소할 수량이 없습니다")
+        return _ok(output={"KRX_FWDG_ORD_ORGNO": "01790", "ODNO": odno})
+
+    @app.get("/uapi/overseas-stock/v1/trading/inquire-psamount")
+    def inquire_psamount():
+        price = float(request.args["OVRS_ORD_UNPR"]) or 1.0
+        cash = broker.cash["os"]
+        return _ok(output={"ord_psbl_frcr_amt": f"{cash:.2f}", "ovrs_ord_psbl_amt": f"{cash:.2f}", "max_ord_psbl_qty": str(int(cash / price))})
+
+    return app
+
+
+class _Handler(WSGIRequestHandler):
+    """KIS 헤더(tr_id, tr_cont)는 밑줄이 들어가서 werkzeug 가 버리므로 직접 environ 에 넣고, 접속 로그는 끔"""
+    def make_environ(self):
+        environ = super().make_environ()
+        for key, value in self.headers.items():
+            if "_" in key: environ["HTTP_" + key.upper().replace("-", "_")] = value
+        return environ
+
+    def log_request(self, *args): pass
+
+
+def serve(broker, host="127.0.0.1", port=0):
+    """모의 서버를 백그라운드 스레드로 띄움 -> (서버, 기본 URL). 끝나면 server.shutdown()"""
+    server = make_server(host, port, create_app(broker), threaded=True, request_handler=_Handler)
+    threading.Thread(target=server.serve_forever, name="mock-kis", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+class QuoteStandIn:
+    """KIS 실시간 시세 WebSocket 흉내.
+    구독한 종목의 현재가(prices 의 마지막 종가, tick 이 있으면 그만큼 흔든 값)를 interval 초마다 KIS 형식으로 보낸다.
+    pause() 로 전송을 멈추거나 drop() 으로 연결을 끊어 REST 대체 경로를 확인할 수 있다."""
+    def __init__(self, prices, interval=0.2, tick=0.0, seed=0):
+        self.prices = prices
+        self.interval = interval
+        self.tick = tick  # 전송마다 가격을 ±tick 비율 안에서 흔듦
+        self.paused = False
+        self._rng = random.Random(seed)
+        self._loop = asyncio.new_event_loop()
+        self._connections = set()
+        self._server = None
+
+    def _frame(self, tr_id, key):
+        symbol = f"{key}.KS" if tr_id == quote_feed.KR_TRADE else key[4:]
+        price = self.prices.last(symbol) * (1 + self._rng.uniform(-self.tick, self.tick))
+        if tr_id == quote_feed.KR_TRADE:
+            fields = [key, time.strftime("%H%M%S"), str(int(price))] + ["0"] * 43
+        else:
+            fields = [key, key[4:], "4", time.strftime("%Y%m%d"), "", "", "", time.strftime("%H%M%S")] + ["0"] * 3 + [f"{price:.4f}"] + ["0"] * 14
+        return f"0|{tr_id}|001|{'^'.join(fields)}"
+
+    async def _handler(self, ws):
+        subscribed = set()
+        self._connections.add(ws)
+
+        async def push():
+            while True:
+                await asyncio.sleep(self.interval)
+                if not self.paused:
+                    for tr_id, key in list(subscribed):
+                        await ws.send(self._frame(tr_id, key))
+
+        pusher = asyncio.ensure_future(push())
+        try:
+            async for text in ws:
+                msg = json.loads(text)
+                if msg.get("header", {}).get("tr_id") == "PINGPONG": continue
+                body = msg["body"]["input"]
+                (subscribed.add if msg["header"]["tr_type"] == "1" else subscribed.discard)((body["tr_id"], body["tr_key"]))
+                await ws.send(json.dumps({"header": {"tr_id": body["tr_id"], "tr_key": body["tr_key"], "encrypt": "N"},
+                                          "body": {"rt_cd": "0", "msg_cd": "OPSP0000", "msg1": "SUBSCRIBE SUCCESS"}}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            pusher.cancel()
+            self._connections.discard(ws)
+
+    def start(self, host="127.0.0.1", port=0):
+        """백그라운드 스레드에서 서버 시작 -> ws:// URL"""
+        async def open_server():
+            self._server = await websockets.serve(self._handler, host, port)
+            return self._server.sockets[0].getsockname()[1]
+        threading.Thread(target=self._loop.run_forever, name="mock-quotes", daemon=True).start()
+        port = asyncio.run_coroutine_threadsafe(open_server(), self._loop).result()
+        return f"ws://{host}:{port}"
+
+    def pause(self, paused=True):
+        self.paused = paused
+
+    def drop(self):
+        """열린 연결을 모두 끊음 (클라이언트는 재접속해야 함)"""
+        for ws in list(self._connections):
+            asyncio.run_coroutine_threadsafe(ws.close(), self._loop)
+
+    def stop(self):
+        if self._server:
+            self._server.close()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="KIS 모의 서버")
+    parser.add_argument("--port", type=int, default=29443)
+    parser.add_argument("--latency", type=float, default=0.0, help="요청당 고정 지연(초)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="추가 랜덤 지연 최대값(초)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rps", type=int, default=0, help="초당 허용 요청 수 (0 이면 무제한)")
+    parser.add_argument("--fill-polls", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    mock = MockBroker(FixturePrices(args.seed), args.latency, args.jitter, args.error_rate, args.rps, args.fill_polls, seed=args.seed)
+    server, url = serve(mock, port=args.port)
+    print(f"KIS 모의 서버: {url} (config.yaml 의 URL_BASE 로 지정)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,121 @@
+"""KIS 실시간 체결가 WebSocket 구독 -> 메모리 최근 시세표.
+
+주문 가격/수량 계산이 REST 시세 조회나 yfinance 종가를 기다리지 않도록, 구독 중인 종목의 마지막 체결가를 들고 있는다.
+연결이 끊겼거나 시세가 오래됐으면 price() 가 None 을 돌려주므로 호출하는 쪽은 REST 로 대신 조회한다.
+websockets 패키지가 없으면 구독하지 않는다 (available=False).
+"""
+import asyncio
+import json
+import threading
+import time
+
+try:
+    import websockets  # 선택 의존성
+except ImportError:
+    websockets = None
+
+KR_TRADE = "H0STCNT0"  # 국내주식 실시간체결가
+OS_TRADE = "HDFSCNT0"  # 해외주식 실시간지연체결가 (키: D + 거래소(NAS/NYS/AMS) + 종목)
+PRICE_FIELD = {KR_TRADE: (0, 2), OS_TRADE: (0, 11)}  # 레코드 안 (종목 키, 현재가) 위치
+
+
+def parse_frame(text):
+    """실시간 데이터 '0|tr_id|건수|필드^필드^...' -> [(tr_id, 키, 가격)]. 암호화('1')나 모르는 tr_id 는 무시"""
+    parts = text.split("|", 3)
+    if len(parts) < 4 or parts[0] != "0" or parts[1] not in PRICE_FIELD:
+        return []
+    tr_id, fields = parts[1], parts[3].split("^")
+    count = max(int(parts[2]), 1)
+    key_at, price_at = PRICE_FIELD[tr_id]
+    width = len(fields) // count
+    out = []
+    for i in range(count):
+        record = fields[i * width:(i + 1) * width]
+        try:
+            out.append((tr_id, record[key_at], float(record[price_at])))
+        except (IndexError, ValueError):
+            pass
+    return out
+
+
+class QuoteFeed:
+    """실시간 시세 구독. run() 을 엔진 태스크로 돌리면 끊길 때마다 1초부터 최대 60초 간격으로 다시 붙는다."""
+    def __init__(self, url, approval_key, max_age=10, on_status=None):
+        self.url = url
+        self.approval_key = approval_key  # () -> 웹소켓 접속키 (동기 함수, 엔진 실행기에서 호출)
+        self.max_age = max_age
+        self.on_status = on_status  # (메시지) -> None, 연결 상태가 바뀔 때 호출
+        self.quotes = {}  # (tr_id, 키) -> (가격, 받은 시각)
+        self.subscriptions = set()
+        self.connected = False
+        self._approval = None
+        self._ws = None
+        self._loop = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return websockets is not None
+
+    def price(self, tr_id, key, max_age=None):
+        """max_age 초 안에 받은 최근가 (없거나 오래됐거나 연결이 끊겼으면 None)"""
+        quote = self.quotes.get((tr_id, key))
+        if not quote or not self.connected:
+            return None
+        price, at = quote
+        return price if time.monotonic() - at <= (max_age or self.max_age) else None
+
+    def subscribe(self, tr_id, key):
+        """구독 추가 (어느 스레드에서나 호출 가능). 연결 중이면 바로 등록 메시지를 보낸다"""
+        with self._lock:
+            if (tr_id, key) in self.subscriptions: return
+            self.subscriptions.add((tr_id, key))
+        if self.connected and self._loop:
+            asyncio.run_coroutine_threadsafe(self._send(tr_id, key), self._loop)
+
+    def _request(self, tr_id, key, tr_type="1"):
+        return json.dumps({"header": {"approval_key": self._approval, "custtype": "P", "tr_type": tr_type, "content-type": "utf-8"},
+                           "body": {"input": {"tr_id": tr_id, "tr_key": key}}})
+
+    async def _send(self, tr_id, key):
+        if self._ws is not None:
+            await self._ws.send(self._request(tr_id, key))
+
+    async def _handle(self, ws, text):
+        if text[:1] in ("0", "1"):
+            now = time.monotonic()
+            for tr_id, key, price in parse_frame(text):
+                self.quotes[(tr_id, key)] = (price, now)
+            return
+        header = json.loads(text).get("header", {})
+        if header.get("tr_id") == "PINGPONG":
+            await ws.send(text)  # 서버 핑에 그대로 응답해야 연결이 유지됨
+
+    async def run(self, blocking):
+        """연결/재연결 루프. blocking: 동기 함수를 실행기에서 돌리는 코루틴 함수 (Engine.blocking)"""
+        self._loop = asyncio.get_running_loop()
+        delay = 1
+        while True:
+            try:
+                self._approval = await blocking(self.approval_key)
+                async with websockets.connect(self.url, ping_interval=None, open_timeout=10) as ws:
+                    self._ws = ws
+                    for tr_id, key in list(self.subscriptions):
+                        await ws.send(self._request(tr_id, key))
+                    self.connected, delay = True, 1
+                    if self.on_status: self.on_status(f"📡 실시간 시세 연결 ({len(self.subscriptions)}종목)")
+                    async for text in ws:
+                        await self._handle(ws, text)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass  # 접속키 발급 실패, 연결 거부/끊김 -> 잠시 뒤 재접속
+            finally:
+                if self.connected and self.on_status: self.on_status("📡 실시간 시세 끊김, 재접속 전까지 REST 로 조회")
+                self.connected, self._ws = False, None
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    def close(self):
+        if self._ws is not None and self._loop:
+            asyncio.run_coroutine_threadsafe(self._ws.close(), self._loop)
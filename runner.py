@@ -0,0 +1,212 @@
+"""여러 계좌/전략 동시 운용.
+
+config.yaml 의 ACCOUNTS 목록을 읽어 계좌마다 매매 엔진 프로세스(final_app.py --engine)를 하나씩 띄우고,
+각 엔진에 IPC 로 붙어 상태를 모아 보여주는 통합 대시보드를 연다.
+계좌마다 프로세스가 따로라 접근 토큰, 레이트리미터, 상태, 체크포인트, 이벤트 로그가 섞이지 않는다.
+일봉 저장소(PRICE_DB)는 모든 계좌가 같은 파일을 쓰므로 같은 종목은 한 번만 내려받는다.
+엔진이 죽으면 다시 띄우고, 엔진은 체크포인트에서 이어서 돈다.
+
+ACCOUNTS 항목은 위쪽 공통 설정을 덮어쓴다 (NAME 필수, 나머지는 계좌번호/키/전략 값 등 바꿀 것만):
+    ACCOUNTS:
+      - {NAME: "main", CANO: "50158320", ACNT_PRDT_CD: "01"}
+      - {NAME: "short-lookback", CANO: "50158321", ACNT_PRDT_CD: "01", LOOKBACK: 63, BUY_AMOUNT: 500000}
+
+사용 예: python runner.py --port 5000 --workdir accounts
+"""
+import argparse
+import hashlib
+import os
+import re
+import secrets
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+from flask import Flask, jsonify, render_template
+
+import engine_ipc
+
+MARKETS = ("kr", "os")
+
+
+def _number(value):
+    try:
+        return float(str(value).replace(",", ""))
+    except ValueError:
+        return 0.0
+
+
+def account_configs(cfg, workdir, base_port, authkey):
+    """공통 설정 + ACCOUNTS 항목 -> [(이름, 계좌별 설정 dict)]. 계좌별 파일은 workdir/<이름>/ 아래에 둔다"""
+    base = {k: v for k, v in cfg.items() if k != "ACCOUNTS"}
+    out = []
+    for i, entry in enumerate(cfg.get("ACCOUNTS") or []):
+        name = re.sub(r"[^\w.-]", "_", str(entry["NAME"]))
+        home = os.path.join(workdir, name)
+        merged = dict(base, **{k: v for k, v in entry.items() if k != "NAME"})
+        app_key = hashlib.sha1(str(merged["APP_KEY"]).encode()).hexdigest()[:10]
+        merged.update(
+            ACCOUNT=name,
+            ENGINE_ADDRESS=f"127.0.0.1:{base_port + i}",
+            ENGINE_AUTHKEY=authkey,
+            TOKEN_FILE=os.path.join(workdir, f"token-{app_key}.dat"),  # 토큰은 앱키 단위로 발급되므로 같은 앱키끼리 공유
+            CHECKPOINT_PATH=os.path.join(home, "engine_state.json"),
+            EVENT_LOG_PATH=os.path.join(home, "events.jsonl"),
+        )
+        out.append((name, merged))
+    return out
+
+
+class AccountEngine:
+    """계좌 하나의 엔진 프로세스. 출력은 workdir/<이름>/engine.log 에 남긴다"""
+    def __init__(self, name, cfg, workdir):
+        self.name = name
+        self.cfg = cfg
+        self.home = os.path.join(workdir, name)
+        self.config_path = os.path.join(self.home, "config.yaml")
+        self.client = engine_ipc.EngineClient(cfg["ENGINE_ADDRESS"], cfg["ENGINE_AUTHKEY"].encode())
+        self.proc = None
+        self.started_at = 0.0
+        self.restarts = 0
+
+    def start(self):
+        os.makedirs(self.home, exist_ok=True)
+        with open(self.config_path, 'w', encoding='UTF-8') as f:
+            yaml.safe_dump(self.cfg, f, allow_unicode=True)
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "final_app.py")
+        log = open(os.path.join(self.home, "engine.log"), 'a', encoding='UTF-8')
+        self.proc = subprocess.Popen([sys.executable, "-u", script, "--engine"], stdout=log, stderr=subprocess.STDOUT,
+                                     env=dict(os.environ, KIS_CONFIG=self.config_path))
+        log.close()
+        self.started_at = time.monotonic()
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def stop(self):
+        if self.alive():
+            self.proc.terminate()
+            try:
+                self.proc.wait(10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+    def view(self):
+        """통합 대시보드용 요약 (엔진이 응답하지 않으면 error)"""
+        out = {"name": self.name, "cano": f"{self.cfg['CANO']}-{self.cfg['ACNT_PRDT_CD']}", "alive": self.alive(), "restarts": self.restarts}
+        try:
+            for market in MARKETS:
+                status = self.client.call("status", market)
+                log = status.pop("log", [])
+                out[market] = dict(status, last_log=log[0] if log else "")
+        except (engine_ipc.EngineUnavailable, RuntimeError) as e:
+            out["error"] = str(e)
+        return out
+
+
+class Runner:
+    """계좌 엔진 프로세스 묶음. supervise 스레드가 죽은 엔진을 다시 띄운다 (바로 다시 죽으면 최대 5분까지 간격을 늘림)"""
+    def __init__(self, accounts, workdir, max_workers=16):
+        self.engines = {name: AccountEngine(name, cfg, workdir) for name, cfg in accounts}
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="runner")
+        self._retry_at = {}  # 이름 -> 다시 띄울 시각
+        self._backoff = {}  # 이름 -> 마지막 재시작 대기 초
+        self._stopping = threading.Event()
+
+    def start(self):
+        for eng in self.engines.values():
+            eng.start()
+        threading.Thread(target=self.supervise, name="supervise", daemon=True).start()
+
+    def supervise(self):
+        while not self._stopping.wait(2):
+            now = time.monotonic()
+            for name, eng in self.engines.items():
+                if eng.alive(): continue
+                if name not in self._retry_at:
+                    delay = 5 if now - eng.started_at > 60 else min(self._backoff.get(name, 2.5) * 2, 300)
+                    self._backoff[name] = delay
+                    self._retry_at[name] = now + delay
+                    print(f"⚠️ [{name}] 엔진 종료 (code {eng.proc.returncode}), {delay:.0f}초 뒤 재시작")
+                elif now >= self._retry_at[name]:
+                    del self._retry_at[name]
+                    eng.restarts += 1
+                    eng.start()
+
+    def stop(self):
+        self._stopping.set()
+        for eng in self.engines.values():
+            eng.stop()
+
+    def overview(self):
+        """전체 계좌 요약을 병렬로 모음 + 시장별 합계"""
+        accounts = list(self.pool.map(AccountEngine.view, self.engines.values()))
+        totals = {
+            "accounts": len(accounts),
+            "running_kr": sum(1 for a in accounts if a.get("kr", {}).get("is_running")),
+            "running_os": sum(1 for a in accounts if a.get("os", {}).get("is_running")),
+            "balance_kr": sum(_number(a.get("kr", {}).get("balance", 0)) for a in accounts),
+            "total_asset_os": sum(_number(a.get("os", {}).get("total_asset", 0)) for a in accounts),
+            "errors": sum(1 for a in accounts if "error" in a),
+        }
+        return {"accounts": accounts, "totals": totals}
+
+    def command(self, name, action, market):
+        """name 이 'all' 이면 전체 계좌에 (병렬) -> {이름: 결과}"""
+        targets = list(self.engines.values()) if name == "all" else [self.engines[name]]
+
+        def send(eng):
+            try:
+                return eng.name, eng.client.call(action, market) is not False
+            except (engine_ipc.EngineUnavailable, RuntimeError):
+                return eng.name, False
+        return dict(self.pool.map(send, targets))
+
+
+def create_app(runner):
+    app = Flask(__name__)
+
+    @app.route('/')
+    def index(): return render_template('accounts.html')
+
+    @app.route('/health')
+    def health(): return jsonify(status="ok", engines={n: e.alive() for n, e in runner.engines.items()})
+
+    @app.route('/accounts')
+    def accounts(): return jsonify(runner.overview())
+
+    @app.route('/accounts/<name>/<market>/<action>', methods=['POST'])
+    def command(name, market, action):
+        if market not in MARKETS or action not in ("start", "stop") or (name != "all" and name not in runner.engines):
+            return jsonify(status="fail"), 404
+        results = runner.command(name, action, market)
+        return jsonify(status="ok" if all(results.values()) else "fail", results=results)
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="여러 계좌/전략 매매 엔진 실행 + 통합 대시보드")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--workdir", default="accounts", help="계좌별 설정/토큰/체크포인트/로그 저장 위치")
+    parser.add_argument("--base-port", type=int, default=5100, help="계좌 엔진 IPC 포트 시작 번호 (계좌 순서대로 +1)")
+    parser.add_argument("--port", type=int, default=5000, help="통합 대시보드 포트")
+    args = parser.parse_args()
+
+    with open(args.config, encoding='UTF-8') as f:
+        cfg = yaml.load(f, Loader=yaml.FullLoader)
+    accounts = account_configs(cfg, args.workdir, args.base_port, secrets.token_hex(16))
+    if not accounts:
+        parser.error(f"{args.config} 에 ACCOUNTS 가 없습니다")
+
+    runner = Runner(accounts, args.workdir)
+    runner.start()
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # kill 로 끝내도 아래 finally 에서 엔진을 정리
+    try:
+        create_app(runner).run(host='0.0.0.0', port=args.port, debug=False, threaded=True)
+    finally:
+        runner.stop()
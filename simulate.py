@@ -0,0 +1,189 @@
+"""가속 모의매매 시뮬레이션.
+가상 시계(SimClock)를 final_app 에 끼우고, 기록된 일봉(PRICE_DB)·분봉(CSV)을 재생하는 로컬 KIS 모의 서버에 붙여
+trading_logic_kr / overseas_trading_logic 를 그대로 돌린다. 장 시간 판단, 주문/체결 순서, 이벤트 로그는 실매매와 같다.
+
+시계는 매매 스레드가 모두 대기 중일 때만 가장 가까운 깨어날 시각으로 건너뛰므로,
+--speed 0(기본)이면 몇 달치 장을 몇 분 안에 돌려볼 수 있다. --speed 3600 처럼 주면 실제 1초에 가상 1시간씩 진행한다.
+
+사용 예: python simulate.py --start 2026-01-05 --end 2026-03-31 --market kr --market os
+        python simulate.py --start 2026-03-02 --end 2026-03-06 --fixture 1 --speed 3600 --serve 5001
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+import market_calendar
+import mock_kis
+
+
+class SimClock:
+    """가상 시계. final_app.Clock 과 같은 인터페이스.
+    actors 개의 매매 스레드가 모두 wait 에 들어가면 가장 이른 깨어날 시각으로 시간을 옮긴다. end 에 닿으면 done 이 켜진다."""
+    def __init__(self, start, end, actors, speed=0):
+        self._now = start
+        self._origin = start
+        self.end = end
+        self.actors = actors
+        self.speed = speed  # 가상 초 / 실제 초 (0 이면 기다리지 않음)
+        self.done = threading.Event()
+        self._cond = threading.Condition()
+        self._sleepers = {}  # 스레드 -> 깨어날 시각
+        self._threads = set()
+
+    def now(self):
+        return self._now
+
+    def local(self):
+        return self._now.replace(tzinfo=None)  # 화면/로그는 KST 가상 시각 그대로
+
+    def monotonic(self):
+        return (self._now - self._origin).total_seconds()
+
+    def _live(self):
+        return self.actors - sum(1 for t in self._threads if not t.is_alive())
+
+    def _advance(self):
+        target = min(min(self._sleepers.values()), self.end)
+        if target <= self._now:
+            if self._now >= self.end: self.done.set()  # 종료 시각: 정지 요청이 올 때까지 대기
+            self._cond.wait(0.05)  # 아니면 이미 깨어날 시각이 된 스레드가 먼저 진행하도록 양보
+            return
+        if self.speed:
+            time.sleep((target - self._now).total_seconds() / self.speed)
+        self._now = target
+        self._cond.notify_all()
+
+    async def sleep(self, event, seconds):
+        """엔진 태스크용: 가상 대기는 실행기 스레드에서 (그 스레드가 매매 주체로 집계됨)"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.wait, event, seconds)
+
+    def wait(self, event, seconds):
+        me = threading.current_thread()
+        with self._cond:
+            self._threads.add(me)
+            self._sleepers[me] = deadline = self._now + datetime.timedelta(seconds=max(seconds, 0))
+            self._cond.notify_all()
+            try:
+                while not event.is_set() and self._now < deadline:
+                    if len(self._sleepers) >= self._live():
+                        self._advance()
+                    else:
+                        self._cond.wait(0.05)  # 다른 매매 스레드가 일하는 중
+            finally:
+                del self._sleepers[me]
+        return event.is_set()
+
+
+class ReplayPrices:
+    """기록된 시세를 가상 시계에 맞춰 내보냄 (가상 현재 시각 이후 데이터는 보이지 않음).
+    PriceStore 의 source 로는 확정된 일봉만, 모의 서버 현재가로는 분봉(있으면) 또는 당일 종가를 준다."""
+    def __init__(self, clock, daily, intraday=None, calendars=None):
+        self.clock = clock
+        self.daily = daily  # {종목: 날짜 인덱스 종가 Series}
+        self.intraday = intraday or {}  # {종목: 시각(tz 포함) 인덱스 가격 Series}
+        self.calendars = calendars or {"kr": market_calendar.krx_calendar(), "os": market_calendar.nyse_calendar()}
+
+    def _calendar(self, ticker):
+        return self.calendars["kr" if ticker.endswith(".KS") else "os"]
+
+    def __call__(self, ticker, start=None):
+        s = self.daily[ticker]
+        s = s[s.index <= pd.Timestamp(self._calendar(ticker).last_session_date(self.clock.now()))]
+        return s[s.index >= pd.Timestamp(start)] if start else s.iloc[-252:]
+
+    def last(self, ticker):
+        bars = self.intraday.get(ticker)
+        if bars is not None:
+            seen = bars[bars.index <= self.clock.now()]
+            if len(seen): return float(seen.iloc[-1])
+        today = pd.Timestamp(self.clock.now().astimezone(self._calendar(ticker).tz).date())
+        s = self.daily[ticker]
+        return float(s[s.index <= today].iloc[-1])
+
+
+def load_daily(db_path, tickers):
+    with sqlite3.connect(db_path) as con:
+        return {t: pd.Series({pd.Timestamp(d): c for d, c in con.execute("SELECT date, close FROM daily WHERE ticker = ? ORDER BY date", (t,))}, name=t)
+                for t in tickers}
+
+
+def load_intraday(path):
+    """CSV (ticker,timestamp,price). 시간대 없는 시각은 KST 로 본다"""
+    df = pd.read_csv(path)
+    ts = pd.to_datetime(df["timestamp"])
+    df["timestamp"] = ts.dt.tz_localize(market_calendar.KST) if ts.dt.tz is None else ts.dt.tz_convert(market_calendar.KST)
+    return {t: g.set_index("timestamp")["price"].sort_index() for t, g in df.groupby("ticker")}
+
+
+def run(app, start, end, markets, daily, intraday=None, speed=0, fill_polls=1, events_path='', workdir='.'):
+    """final_app 을 가상 시계/재생 시세/모의 서버로 바꿔 끼우고 markets 를 start~end 동안 돌림 -> MockBroker"""
+    clock = SimClock(start, end, len(markets), speed)
+    prices = ReplayPrices(clock, daily, intraday, {"kr": app.KRX, "os": app.NYSE})
+    broker = mock_kis.MockBroker(prices, fill_polls=fill_polls, exchanges=app.SYMBOL_EXCHANGE_OS)
+    server, url = mock_kis.serve(broker)
+    app.clock = clock
+    app.kis = app.KisClient(url, app.APP_KEY, app.APP_SECRET, rps=1000, token_file=os.path.join(workdir, "token.dat"))
+    app.price_store = app.PriceStore(os.path.join(workdir, "prices.db"), source=prices)
+    app.exchanges_os = app.ExchangeResolver(os.path.join(workdir, "exchanges.json"), app.SYMBOL_EXCHANGE_OS)
+    app.events = app.EventLog(app.EVENT_LOG_SIZE, events_path)
+    app.notifier = None
+    app.QUOTE_FEED = False  # 가상 시각의 시세는 모의 서버 REST 로만 받음
+    for market in markets:
+        app.workers[market].start()
+    clock.done.wait()
+    for market in markets:
+        app.workers[market].stop()
+        app.workers[market].join(timeout=30)
+    server.shutdown()
+    return broker
+
+
+def _report(app, broker, markets):
+    for market in markets:
+        kinds = [e["type"] for e in app.events.after(0, market, limit=app.EVENT_LOG_SIZE)]
+        value = broker.cash[market] + sum(q * broker.quote(s, market) for s, q in broker.holdings[market].items())
+        unit = "원" if market == "kr" else "$"
+        print(f"[{market}] 분석 {kinds.count('signal')}회, 주문 이벤트 {kinds.count('order')}건, 체결 {kinds.count('fill')}건, 오류 {kinds.count('error')}건")
+        print(f"     보유 {broker.holdings[market]}, 현금 {broker.cash[market]:,.2f}, 평가액 {value:,.2f}{unit}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="가속 모의매매 시뮬레이션")
+    parser.add_argument("--start", required=True, help="시작일 (KST, YYYY-MM-DD)")
+    parser.add_argument("--end", required=True, help="종료일 (KST, 해당일 끝까지)")
+    parser.add_argument("--market", choices=["kr", "os"], action="append", help="여러 번 지정 가능 (기본: 둘 다)")
+    parser.add_argument("--speed", type=float, default=0, help="가상 초 / 실제 초 (0 이면 최대 속도)")
+    parser.add_argument("--intraday", help="분봉 CSV (ticker,timestamp,price)")
+    parser.add_argument("--fixture", type=int, help="기록 대신 이 seed 의 고정 랜덤워크 일봉 사용")
+    parser.add_argument("--fill-polls", type=int, default=1, help="체결까지 필요한 미체결 조회 횟수")
+    parser.add_argument("--events", default='', help="이벤트 JSONL 저장 경로")
+    parser.add_argument("--serve", type=int, help="대시보드를 이 포트로 띄워 진행 상황 확인")
+    args = parser.parse_args()
+
+    import final_app
+
+    markets = args.market or ["kr", "os"]
+    start = datetime.datetime.fromisoformat(args.start).replace(tzinfo=market_calendar.KST)
+    end = datetime.datetime.fromisoformat(args.end).replace(tzinfo=market_calendar.KST) + datetime.timedelta(days=1)
+    tickers = [f"{c}.KS" for c in final_app.ASSETS_KR.values()] + list(final_app.UNIVERSE_OS) + [final_app.SAFE_ASSET_OS]
+    if args.fixture is not None:
+        fixture = mock_kis.FixturePrices(args.fixture, days=(end - start).days + 400, end=end.date())
+        daily = {t: fixture.series(t) for t in tickers}
+    else:
+        daily = load_daily(final_app.PRICE_DB, tickers)  # backtest.py --update 로 미리 채워 둔 기록
+    if args.serve:
+        threading.Thread(target=final_app.app.run, kwargs={"host": "127.0.0.1", "port": args.serve}, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        began = time.perf_counter()
+        broker = run(final_app, start, end, markets, daily, load_intraday(args.intraday) if args.intraday else None,
+                     args.speed, args.fill_polls, args.events, workdir)
+        print(f"\n{args.start} ~ {args.end} 시뮬레이션 완료 ({time.perf_counter() - began:.1f}초)")
+        _report(final_app, broker, markets)
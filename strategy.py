@@ -0,0 +1,24 @@
+"""듀얼 모멘텀 신호 계산 (실매매 루프와 백테스트가 같은 규칙을 사용)"""
+import numpy as np
+
+
+def momentum(closes, lookback):
+    """종목별 lookback 봉 수익률 (closes: 날짜 x 종목 DataFrame).
+    lookback=126 이면 최근 종가 / 126번째 전 종가(iloc[-126]) - 1"""
+    closes = closes.ffill()
+    return closes.iloc[-1] / closes.iloc[-lookback] - 1
+
+
+def target_weights(returns, top_k=1):
+    """모멘텀 수익률 배열(..., 종목수)로 목표 비중 배열(..., 종목수+1) 계산. 마지막 열은 대피 자산.
+    상위 top_k 종목에 1/top_k씩 배분하되, 수익률이 0 이하인 자리는 대피 자산으로 돌린다.
+    top_k=1 이면 '가장 많이 오른 종목, 모두 마이너스면 대피 자산' 규칙과 같다."""
+    r = np.asarray(returns, dtype=float)
+    r = np.where(np.isnan(r), -np.inf, r)
+    k = min(top_k, r.shape[-1])
+    top_idx = np.argsort(-r, axis=-1, kind='stable')[..., :k]
+    top_ret = np.take_along_axis(r, top_idx, axis=-1)
+    weights = np.zeros(r.shape)
+    np.put_along_axis(weights, top_idx, np.where(top_ret > 0, 1.0 / k, 0.0), axis=-1)
+    safe = 1.0 - weights.sum(axis=-1, keepdims=True)
+    return np.concatenate([weights, safe], axis=-1)